@@ -1,6 +1,6 @@
 {
     "name": "Murojatlar",
-    "version": "1.1",
+    "version": "1.3",
     "summary": "Office Manager CRM: Usta biriktirish, hudud, kategoriya, foto hisobot, vaqt va summalar",
     "depends": [
         "crm",
@@ -18,6 +18,7 @@
     "data": [
         "security/ir.model.access.csv",
         "data/sequence.xml",
+        "data/ir_cron.xml",
         "views/user_view.xml",
         "views/crm_lead_views.xml",
         "views/stage_color.xml",
@@ -37,6 +38,9 @@
             "crm_office_ui/static/src/scss/crm_stage_colors.scss",
             "crm_office_ui/static/src/js/crm_button_labels.js",
             'crm_office_ui/static/src/js/html_raw_widget.js',
+            "crm_office_ui/static/src/scss/photo_gallery.scss",
+            "crm_office_ui/static/src/js/photo_gallery.js",
+            "crm_office_ui/static/src/xml/photo_gallery.xml",
         ],
         "web.assets_qweb": [
             "crm_office_ui/static/src/xml/kanban_header_count.xml",
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import json
+
+from odoo import http
+from odoo.http import request
+
+from ..models.crm_lead import VOICE_ROUTE
+from ..models.crm_lead_sms_queue import CALLBACK_ROUTE
+
+
+class CrmOfficeUiController(http.Controller):
+
+    @http.route(CALLBACK_ROUTE, type="http", auth="public", methods=["POST"], csrf=False)
+    def eskiz_sms_callback(self, **post):
+        """Eskiz delivery report (JSON body or form data), matched by our random user_sms_id.
+
+        Only accepted with the shared secret we put in callback_url (?token=...).
+        """
+        Queue = request.env["crm.lead.sms.queue"].sudo()
+        if not Queue._check_callback_token(request.httprequest.args.get("token")):
+            return request.make_response("Forbidden", status=403)
+        data = dict(post)
+        data.pop("token", None)
+        if not data.get("user_sms_id"):
+            try:
+                data = json.loads(request.httprequest.get_data() or b"{}")
+            except ValueError:
+                data = {}
+        Queue._record_callback(data)
+        return request.make_response("OK")
+
+    @http.route("/crm_office_ui/lead/<int:lead_id>/photos", type="http", auth="user", methods=["GET"])
+    def lead_photos(self, lead_id, **kw):
+        """Image attachment ids + checksums of a lead; revalidated by ETag, so unchanged galleries cost a 304."""
+        lead = request.env["crm.lead"].browse(lead_id).exists()
+        if not lead:
+            return request.not_found()
+        lead.check_access_rights("read")
+        lead.check_access_rule("read")
+        photos = lead.sudo()._photo_gallery_payload()
+        etag = hashlib.sha1(
+            ",".join(f"{p['id']}:{p['checksum']}" for p in photos).encode()
+        ).hexdigest()
+        headers = [("ETag", f'"{etag}"'), ("Cache-Control", "private, max-age=0, must-revalidate")]
+        if request.httprequest.if_none_match.contains(etag):
+            return request.make_response("", headers=headers, status=304)
+        return request.make_json_response(photos, headers=headers)
+
+    @http.route(f"{VOICE_ROUTE}/<int:attachment_id>", type="http", auth="user", methods=["GET"])
+    def lead_voice(self, attachment_id, unique=None, **kw):
+        """Stream an audio attachment with Range support (206 partial content) and ETag revalidation."""
+        att = request.env["ir.binary"]._find_record(res_model="ir.attachment", res_id=attachment_id)
+        if not (att.mimetype or "").startswith("audio/"):
+            return request.not_found()
+        stream = request.env["ir.binary"]._get_stream_from(att)
+        # checksum in the URL: the bytes behind it never change
+        return stream.get_response(as_attachment=False, immutable=bool(unique))
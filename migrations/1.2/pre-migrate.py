@@ -0,0 +1,11 @@
+# -*- coding: utf-8 -*-
+from odoo.addons.crm_office_ui.models.crm_calls import _utel_backfill_tails, _utel_ensure_tail_columns
+
+
+def migrate(cr, version):
+    # utel_call may hold millions of rows: fill the phone tails in committed chunks
+    # before the registry loads, so CrmLeadUtel.init() finds them ready.
+    _utel_ensure_tail_columns(cr)
+    cr.execute("SELECT to_regclass('utel_call')")
+    if cr.fetchone()[0]:
+        _utel_backfill_tails(cr, commit=True)
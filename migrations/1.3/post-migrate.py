@@ -0,0 +1,9 @@
+# -*- coding: utf-8 -*-
+from odoo import SUPERUSER_ID, api
+
+
+def migrate(cr, version):
+    # the sale snapshot fields became stored computes: existing columns are kept as they are,
+    # so copy the sync values into lines that never got a snapshot (committed per chunk)
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    env["crm.lead.product.line"]._refresh_sale_snapshot()
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+import logging
+
+_logger = logging.getLogger(__name__)
+
+
+def migrate(cr, version):
+    # x_src_tail/x_dst_tail are declared on utel.call now: drop the manual field records that
+    # 1.2 created (in SQL, an ORM unlink would drop the filled columns too)
+    cr.execute("""
+        DELETE FROM ir_model_fields
+         WHERE model = 'utel.call' AND name IN ('x_src_tail', 'x_dst_tail') AND state = 'manual'
+    """)
+    if cr.rowcount:
+        _logger.info("utel.call: %s manual tail field(s) replaced by model fields", cr.rowcount)
+
+    # the timing backfill fills the section hours too now: let it pass over all leads again
+    cr.execute("""
+        DELETE FROM ir_config_parameter
+         WHERE key IN ('crm_office_ui.backfill_cursor.timing', 'crm_office_ui.backfill_cursor.stage_role')
+    """)
+
+    # retried webhooks used to store the same Telegram message twice: keep the first copy,
+    # so CrmProductWork.init() can create the unique (tg_chat_id, tg_message_id) index
+    cr.execute("SELECT to_regclass('crmproduct_work')")
+    if not cr.fetchone()[0]:
+        return
+    cr.execute("""
+        DELETE FROM crmproduct_work w
+         USING crmproduct_work k
+         WHERE w.tg_chat_id = k.tg_chat_id AND w.tg_message_id = k.tg_message_id
+           AND w.tg_chat_id <> '' AND w.tg_message_id <> '' AND w.id > k.id
+     RETURNING w.id, w.lead_id, w.usta_id, w.state, w.tg_chat_id, w.tg_message_id, k.id
+    """)
+    rows = cr.fetchall()
+    for work_id, lead_id, usta_id, state, chat_id, message_id, kept_id in rows:
+        _logger.info(
+            "crmproduct_work: deleted duplicate %s (lead %s, usta %s, %s, chat %s, message %s), kept %s",
+            work_id, lead_id, usta_id, state, chat_id, message_id, kept_id,
+        )
+    if rows:
+        _logger.info("crmproduct_work: %s duplicate Telegram events removed", len(rows))
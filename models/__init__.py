@@ -1,9 +1,20 @@
 from . import crm_lead
+from . import cc_region_index
+from . import photo_ingest
 from . import crm_lead_photo
 from . import crm_stage_color
+from . import crm_stage_role
 from . import employee_lead_stats
 from . import crm_lead_inherit
 from . import crm_calls
 from . import crm_lead_won_notify
 from . import crm_stage_lead_count
-from . import crm_product
\ No newline at end of file
+from . import crm_product
+from . import crm_lead_telegram_outbox
+from . import crm_lead_sms_queue
+from . import usta_stage_counter
+from . import crm_lead_stage_event
+from . import crm_lead_backfill
+from . import usta_geo_index
+from . import usta_dispatch
+from . import usta_region_map
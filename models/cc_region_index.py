@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+import re
+
+from odoo import api, models, tools
+
+# Uzbek / Russian Cyrillic -> Uzbek Latin
+_CYR2LAT = {
+    "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "е": "e", "ё": "yo", "ж": "j", "з": "z",
+    "и": "i", "й": "y", "к": "k", "л": "l", "м": "m", "н": "n", "о": "o", "п": "p", "р": "r",
+    "с": "s", "т": "t", "у": "u", "ф": "f", "х": "x", "ц": "ts", "ч": "ch", "ш": "sh", "щ": "sh",
+    "ъ": "", "ы": "i", "ь": "", "э": "e", "ю": "yu", "я": "ya",
+    "ў": "o", "қ": "q", "ғ": "g", "ҳ": "h",
+}
+# o'/o‘/oʻ/g'... all collapse to the bare letter
+_APOSTROPHES = re.compile(r"[\'`´ʻʼ‘’′]")
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+# administrative words that one spelling has and the other hasn't
+_NOISE_WORDS = {
+    "tuman", "tumani", "tumanı", "shahar", "shahri", "sh", "t", "rayon", "rayoni", "raion",
+    "district", "city", "gorod", "g", "r", "n",
+}
+
+
+def normalize_region_name(name):
+    """'Мирзо Улуғбек тумани' / "Mirzo Ulug'bek t." -> 'mirzoulugbek'."""
+    s = (name or "").strip().lower()
+    s = "".join(_CYR2LAT.get(ch, ch) for ch in s)
+    s = _APOSTROPHES.sub("", s)
+    words = [w for w in _NON_WORD.split(s) if w and w not in _NOISE_WORDS]
+    return "".join(words)
+
+
+def _skeleton(norm):
+    # Russian vs Uzbek spellings mostly differ in vowels: Чиланзар / Chilonzor -> chlnzr
+    return re.sub(r"[aeiouy]", "", norm)
+
+
+class CcRegion(models.Model):
+    _inherit = "cc.region"
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        res = super().create(vals_list)
+        self.env.registry.clear_cache()  # _region_name_index
+        return res
+
+    def write(self, vals):
+        res = super().write(vals)
+        if "name" in vals or "state_id" in vals or "active" in vals:
+            self.env.registry.clear_cache()
+        return res
+
+    def unlink(self):
+        res = super().unlink()
+        self.env.registry.clear_cache()
+        return res
+
+    @api.model
+    @tools.ormcache()
+    def _region_name_index(self):
+        """{state_id or False: ((normalized name, skeleton, region_id), ...)} — registry cached."""
+        index = {}
+        for r in self.sudo().search_read([], ["name", "state_id"], order="id"):
+            key = normalize_region_name(r["name"])
+            if key:
+                index.setdefault(r["state_id"] and r["state_id"][0], []).append((key, _skeleton(key), r["id"]))
+        return {state: tuple(rows) for state, rows in index.items()}
+
+    @api.model
+    def _match_region_names(self, pairs):
+        """[(name, state_id or False), ...] -> [region_id or False, ...], no query per name.
+
+        Exact normalized match first, then the substring match the old ilike search did,
+        then equal consonant skeletons; without a state the name must be unambiguous.
+        """
+        index = self._region_name_index()
+        everywhere = [row for rows in index.values() for row in rows]
+        memo, out = {}, []
+        for name, state_id in pairs:
+            key = (normalize_region_name(name), state_id or False)
+            if key not in memo:
+                memo[key] = self._match_one(key[0], index.get(key[1], ()) if key[1] else everywhere,
+                                            unique=not key[1])
+            out.append(memo[key])
+        return out
+
+    @staticmethod
+    def _match_one(norm, rows, unique=False):
+        if not norm:
+            return False
+        skel = _skeleton(norm)
+        matchers = (
+            lambda k, sk: k == norm,
+            lambda k, sk: norm in k or k in norm,
+            lambda k, sk: len(skel) >= 3 and sk == skel,
+        )
+        for matcher in matchers:
+            hits = sorted({rid for k, sk, rid in rows if matcher(k, sk)})
+            if hits and (not unique or len(hits) == 1):
+                return hits[0]
+        return False
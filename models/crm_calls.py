@@ -1,9 +1,88 @@
+import logging
+
 from odoo import api, fields, models, _
 
+_logger = logging.getLogger(__name__)
+
+UTEL_TAIL_LEN = 7
+
+
 def _digits_only(num):
     return "".join(ch for ch in str(num or "") if ch.isdigit())
 
 
+def _phone_tail(num):
+    """Last 7 digits of a phone number ('' when it has no digits)."""
+    return _digits_only(num)[-UTEL_TAIL_LEN:]
+
+
+def _utel_ensure_tail_columns(cr):
+    """Add indexed x_src_tail/x_dst_tail columns (kept up to date by a trigger) to utel_call.
+
+    Works at SQL level so the pre-migration can fill them before the registry loads.
+    Returns False when there is no utel_call table.
+    """
+    cr.execute("SELECT to_regclass('utel_call')")
+    if not cr.fetchone()[0]:
+        return False
+    cr.execute(r"""
+        ALTER TABLE utel_call ADD COLUMN IF NOT EXISTS x_src_tail varchar;
+        ALTER TABLE utel_call ADD COLUMN IF NOT EXISTS x_dst_tail varchar;
+        CREATE INDEX IF NOT EXISTS utel_call__x_src_tail_index ON utel_call (x_src_tail);
+        CREATE INDEX IF NOT EXISTS utel_call__x_dst_tail_index ON utel_call (x_dst_tail);
+
+        CREATE OR REPLACE FUNCTION crm_office_ui_utel_call_tails() RETURNS trigger AS $$
+        BEGIN
+            NEW.x_src_tail := right(regexp_replace(coalesce(NEW.src::text, ''), '\D', '', 'g'), %(n)s);
+            NEW.x_dst_tail := right(regexp_replace(coalesce(NEW.dst::text, ''), '\D', '', 'g'), %(n)s);
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS crm_office_ui_utel_call_tails ON utel_call;
+        CREATE TRIGGER crm_office_ui_utel_call_tails
+            BEFORE INSERT OR UPDATE OF src, dst ON utel_call
+            FOR EACH ROW EXECUTE PROCEDURE crm_office_ui_utel_call_tails();
+    """, {"n": UTEL_TAIL_LEN})
+    return True
+
+
+def _utel_backfill_tails(cr, chunk_size=50000, commit=False):
+    """Fill x_src_tail/x_dst_tail for existing calls, one id range at a time."""
+    cr.execute("SELECT min(id), max(id) FROM utel_call WHERE x_src_tail IS NULL")
+    lo, hi = cr.fetchone()
+    if lo is None:
+        return 0
+    total = 0
+    for start in range(lo, hi + 1, chunk_size):
+        cr.execute(r"""
+            UPDATE utel_call
+               SET x_src_tail = right(regexp_replace(coalesce(src::text, ''), '\D', '', 'g'), %(n)s),
+                   x_dst_tail = right(regexp_replace(coalesce(dst::text, ''), '\D', '', 'g'), %(n)s)
+             WHERE id >= %(start)s AND id < %(stop)s AND x_src_tail IS NULL
+        """, {"n": UTEL_TAIL_LEN, "start": start, "stop": start + chunk_size})
+        total += cr.rowcount
+        if commit:
+            cr.commit()
+        _logger.info("utel_call tails: %s rows backfilled (id < %s of %s)", total, start + chunk_size, hi)
+    return total
+
+
+class UtelCall(models.Model):
+    _inherit = "utel.call"
+
+    # normalized 7-digit tails of src/dst, kept up to date by the crm_office_ui_utel_call_tails
+    # trigger, so a plain domain can filter on their indexes
+    x_src_tail = fields.Char(string="Src (7 raqam)", readonly=True, copy=False, index=True)
+    x_dst_tail = fields.Char(string="Dst (7 raqam)", readonly=True, copy=False, index=True)
+
+    def init(self):
+        super().init()
+        if _utel_ensure_tail_columns(self.env.cr):
+            # cheap when nothing is missing: x_src_tail IS NULL is answered by its index
+            _utel_backfill_tails(self.env.cr)
+
+
 class CrmLeadUtel(models.Model):
     _inherit = "crm.lead"
 
@@ -13,66 +92,58 @@ class CrmLeadUtel(models.Model):
         store=False,
     )
 
-    # ---- NEW: phone-based domain only ----
-    def _utel_domain(self):
-        """Domain for utel.call: only by phone digits (lead + partner), no partner_id."""
+    # normalized 7-digit tails, matched by equality against utel.call x_src_tail/x_dst_tail
+    phone_tail = fields.Char(compute="_compute_phone_tails", store=True, index=True)
+    mobile_tail = fields.Char(compute="_compute_phone_tails", store=True, index=True)
+    partner_phone_tail = fields.Char(compute="_compute_phone_tails", store=True, index=True)
+    partner_mobile_tail = fields.Char(compute="_compute_phone_tails", store=True, index=True)
+
+    @api.depends('phone', 'mobile', 'partner_id.phone', 'partner_id.mobile')
+    def _compute_phone_tails(self):
+        for lead in self:
+            lead.phone_tail = _phone_tail(lead.phone) or False
+            lead.mobile_tail = _phone_tail(getattr(lead, 'mobile', None)) or False
+            lead.partner_phone_tail = _phone_tail(lead.partner_id.phone) or False
+            lead.partner_mobile_tail = _phone_tail(lead.partner_id.mobile) or False
+
+    def _utel_phone_tails(self):
+        """Unique tails of lead + partner phones (no partner_id matching)."""
         self.ensure_one()
-        Call = self.env['utel.call'].sudo()
-
-        src_f = 'src_norm' if 'src_norm' in Call._fields else 'src'
-        dst_f = 'dst_norm' if 'dst_norm' in Call._fields else 'dst'
-
-        phones = []
-
-        # lead phones
-        if getattr(self, 'phone', None):
-            phones.append(self.phone)
-        if getattr(self, 'mobile', None):
-            phones.append(self.mobile)
-
-        # partner phones, still as numbers (not partner_id)
-        if self.partner_id:
-            if self.partner_id.phone:
-                phones.append(self.partner_id.phone)
-            if self.partner_id.mobile:
-                phones.append(self.partner_id.mobile)
-
-        # collect unique 7-digit tails
-        tails = set()
-        for p in phones:
-            d = _digits_only(p)
-            if not d:
-                continue
-            tail = d[-7:] if len(d) > 7 else d
-            if tail:
-                tails.add(tail)
+        tails = {self.phone_tail, self.mobile_tail, self.partner_phone_tail, self.partner_mobile_tail}
+        tails.discard(False)
+        return tails
 
+    def _utel_domain(self):
+        """Domain for utel.call: only by phone tails (lead + partner), no partner_id."""
+        self.ensure_one()
+        tails = sorted(self._utel_phone_tails())
         if not tails:
             return []
+        return ['|', ('x_src_tail', 'in', tails), ('x_dst_tail', 'in', tails)]
 
-        # build OR domain: (src ilike t1) OR (dst ilike t1) OR (src ilike t2) OR ...
-        conds = []
-        for t in tails:
-            conds.append((src_f, 'ilike', t))
-            conds.append((dst_f, 'ilike', t))
-
-        dom = []
-        for cond in conds:
-            if not dom:
-                dom = [cond]
-            else:
-                dom = ['|'] + dom + [cond]
-        return dom
-
-    @api.depends('partner_id', 'phone', 'mobile')
+    @api.depends('phone_tail', 'mobile_tail', 'partner_phone_tail', 'partner_mobile_tail')
     def _compute_utel_call_count(self):
-        Call = self.env['utel.call'].sudo()
-        for lead in self:
-            try:
-                dom = lead._utel_domain()
-                lead.utel_call_count = Call.search_count(dom) if dom else 0
-            except Exception:
-                lead.utel_call_count = 0
+        """One grouped query for the whole recordset, memoized per cursor by tail set."""
+        cache = self.env.cr.cache.setdefault('crm_office_ui.utel_call_count', {})
+        keys = {lead: tuple(sorted(lead._utel_phone_tails())) for lead in self}
+        missing = {k for k in keys.values() if k and k not in cache}
+        if missing:
+            missing = list(missing)
+            pos, tails = [], []
+            for i, key in enumerate(missing):
+                pos.extend([i] * len(key))
+                tails.extend(key)
+            self.env.cr.execute("""
+                SELECT lt.pos, count(DISTINCT c.id)
+                  FROM unnest(%s::int[], %s::varchar[]) AS lt(pos, tail)
+                  JOIN utel_call c ON c.x_src_tail = lt.tail OR c.x_dst_tail = lt.tail
+                 GROUP BY lt.pos
+            """, (pos, tails))
+            counts = dict(self.env.cr.fetchall())
+            for i, key in enumerate(missing):
+                cache[key] = counts.get(i, 0)
+        for lead, key in keys.items():
+            lead.utel_call_count = cache.get(key, 0) if key else 0
 
     def action_open_utel_calls(self):
         self.ensure_one()
@@ -1,12 +1,20 @@
 # -*- coding: utf-8 -*-
-from odoo import api, fields, models, _
+import time
+
+from odoo import api, fields, models, tools, _
 from odoo.exceptions import UserError
+from odoo.tools import html_escape
 from urllib.parse import quote_plus
-import requests
-from eskiz_sms import EskizSMS
-from eskiz_sms.exceptions import BadRequest, InvalidCredentials
+
+from .crm_stage_role import WORK_DONE_ROLES
+
+try:
+    import numpy as np
+except ImportError:  # optional: bulk distances fall back to the scalar formula
+    np = None
 
 SERVICE_SEQ_CODE = "crm.lead.service.number"
+TRANSITION_GUARD = "crm_office_ui_transition"
 
 OL0V_TAG_NAME = "Olov🔥"
 OL0V_BONUS_AMOUNT = 50000.0  # so'm
@@ -14,6 +22,22 @@ OL0V_BONUS_AMOUNT = 50000.0  # so'm
 
 PARAM_KM_RATE = "crm.distance_km_rate"
 
+VOICE_ROUTE = "/crm_office_ui/voice"
+
+PURCHASE_ROWS_TTL = 300  # seconds
+PURCHASE_ROWS_MAX_KEYS = 2000
+_PURCHASE_ROWS_CACHE = {}  # (dbname, uid, partner_id, limit) -> (expires, [line vals])
+
+
+def _haversine_km_many(lat1, lon1, lat2, lon2):
+    """Great-circle distances (km) for equal-length coordinate sequences."""
+    if np is None:
+        return [CrmLead._haversine_km(*args) for args in zip(lat1, lon1, lat2, lon2)]
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=float)) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return (6371.0088 * 2 * np.arcsin(np.sqrt(a))).tolist()
+
+
 class CrmLead(models.Model):
     _inherit = "crm.lead"
 
@@ -82,13 +106,6 @@ class CrmLead(models.Model):
         help="Kontakt tanlanganda 'Sotilgan mahsulot' bo'limi mijozning so'nggi xaridlaridan avtomatik to'ldiriladi."
     )
     
-    photo_gallery_html = fields.Html(
-        string="Foto galereya",
-        compute="_compute_photo_gallery_html",
-        sanitize=False
-    )
-    
-    
     new_to_accept_hours = fields.Float(string="New→Qabul (soat)", copy=False)
     accept_to_start_hours = fields.Float(string="Qabul→Jarayon (soat)", copy=False)
     start_to_finish_hours = fields.Float(string="Jarayon→Yakun (soat)", copy=False)
@@ -105,62 +122,15 @@ class CrmLead(models.Model):
     )
 
 
-    @api.depends('photo_attachment_ids', 'photo_attachment_ids.mimetype', 'photo_attachment_ids.write_date')
-    def _compute_photo_gallery_html(self):
-        for rec in self:
-            imgs = rec.photo_attachment_ids.filtered(lambda a: (a.mimetype or '').startswith('image/'))
-            if not imgs:
-                rec.photo_gallery_html = ''
-                continue
+    def _photo_gallery_payload(self):
+        """[{id, checksum, name}] of the lead's image attachments, for the gallery widget."""
+        self.ensure_one()
+        return self.env["ir.attachment"].search_read(
+            [("id", "in", self.photo_attachment_ids.ids), ("mimetype", "=like", "image/%")],
+            ["checksum", "name"],
+            order="id",
+        )
 
-            html = ["""
-    <style>
-    .cl-gallery-grid{display:grid;grid-template-columns:repeat(auto-fill,minmax(110px,1fr));gap:8px}
-    .cl-gallery-grid img{width:100%;height:110px;object-fit:cover;border-radius:8px;cursor:pointer;display:block}
-    .cl-viewer{position:fixed;top:0;left:0;width:60vw;height:100vh;background:#000c;display:none;z-index:9999;
-                justify-content:flex-start;align-items:center;padding-left:20px}
-    .cl-viewer img{max-height:90vh;max-width:55vw;border-radius:8px;box-shadow:0 0 20px #000}
-    .cl-viewer.active{display:flex;animation:fadeIn .2s ease}
-    @keyframes fadeIn{from{opacity:0}to{opacity:1}}
-    .cl-viewer .cl-close{position:absolute;top:20px;left:20px;font-size:26px;color:white;text-decoration:none;cursor:pointer}
-    </style>
-    <div class="cl-gallery-grid">
-    """]
-
-            for a in imgs:
-                url = f"/web/image/ir.attachment/{a.id}/datas"
-                html.append(f'<img src="{url}" data-full="{url}" alt="">')
-            html.append("""
-    </div>
-    <div id="cl-viewer" class="cl-viewer">
-    <span class="cl-close">×</span>
-    <img src="">
-    </div>
-    <script>
-    (function(){
-        const viewer=document.getElementById('cl-viewer');
-        const vimg=viewer.querySelector('img');
-        document.querySelectorAll('.cl-gallery-grid img').forEach(el=>{
-        el.addEventListener('click',()=>{
-            vimg.src=el.dataset.full;
-            viewer.classList.add('active');
-        });
-        });
-        viewer.querySelector('.cl-close').onclick=()=>viewer.classList.remove('active');
-        viewer.onclick=e=>{if(e.target===viewer) viewer.classList.remove('active');};
-    })();
-    </script>
-    """)
-
-            rec.photo_gallery_html = ''.join(html)
-
-
-    @api.onchange('photo_attachment_ids')
-    def _onchange_photo_gallery_live(self):
-        for rec in self:
-            rec._compute_photo_gallery_html()
-            
-            
     @api.onchange('partner_id')
     def _onchange_partner_fill_products_from_purchases(self):
         for lead in self:
@@ -168,13 +138,12 @@ class CrmLead(models.Model):
                 continue
             if lead.product_line_ids:
                 continue
-            lead._load_products_from_partner_purchases(limit_per_partner=25)
+            lead._load_products_from_partner_purchases(limit_per_partner=25, use_cache=True)
 
     def action_load_products_from_purchases(self):
-        for lead in self:
-            if not lead.partner_id:
-                raise UserError(_("Avval Kontaktni tanlang."))
-            lead._load_products_from_partner_purchases(limit_per_partner=50)
+        if self.filtered(lambda l: not l.partner_id):
+            raise UserError(_("Avval Kontaktni tanlang."))
+        self._load_products_from_partner_purchases(limit_per_partner=50)
         return True
 
     
@@ -220,52 +189,150 @@ class CrmLead(models.Model):
     distance_km = fields.Float(string="Masofa (km)", digits=(12, 3))
     distance_amount = fields.Monetary(string="Yo‘l puli", currency_field="currency_id")
 
+    location_lat = fields.Float(string="Manzil kengligi", digits=(10, 7),
+                                compute="_compute_location_latlng", store=True)
+    location_lng = fields.Float(string="Manzil uzunligi", digits=(10, 7),
+                                compute="_compute_location_latlng", store=True)
+
+    @api.depends("location_url")
+    def _compute_location_latlng(self):
+        for rec in self:
+            lat, lng = rec._parse_latlng_from_url(rec.location_url or "")
+            rec.location_lat = lat or 0.0
+            rec.location_lng = lng or 0.0
+
+    def _distance_km_bulk(self):
+        """({lead_id: km}, {lead_id: error}) between each lead and its usta, in one vectorized pass."""
+        rows, errors = [], {}
+        for rec in self:
+            if not rec.usta_id:
+                errors[rec.id] = _("Usta tanlanmagan.")
+            elif not (rec.usta_id.geo_lat and rec.usta_id.geo_lng):
+                errors[rec.id] = _("Ustaning koordinatasi (lat/lng) yo‘q.")
+            elif not (rec.location_lat and rec.location_lng):
+                errors[rec.id] = _("Manzil URL ichidan koordinata topilmadi (Google Maps havolasini bering).")
+            else:
+                rows.append((rec.id, rec.usta_id.geo_lat, rec.usta_id.geo_lng, rec.location_lat, rec.location_lng))
+        if not rows:
+            return {}, errors
+        ids, lat1, lon1, lat2, lon2 = zip(*rows)
+        return dict(zip(ids, _haversine_km_many(lat1, lon1, lat2, lon2))), errors
+
     def action_calc_distance_km(self):
         ICP = self.env["ir.config_parameter"].sudo()
         rate = float(ICP.get_param(PARAM_KM_RATE, "0") or 0)  # so'm/km
-        for rec in self:
-            if not rec.usta_id:
-                raise UserError(_("Usta tanlanmagan."))
-            if not (rec.usta_id.geo_lat and rec.usta_id.geo_lng):
-                raise UserError(_("Ustaning koordinatasi (lat/lng) yo‘q."))
-            lat2, lng2 = self._parse_latlng_from_url(rec.location_url or "")
-            if lat2 is None or lng2 is None:
-                raise UserError(_("Manzil URL ichidan koordinata topilmadi (Google Maps havolasini bering)."))
-            km = self._haversine_km(rec.usta_id.geo_lat, rec.usta_id.geo_lng, lat2, lng2)
-            rec.distance_km = round(km, 3)
-            rec.distance_amount = round(km * rate, 0)
-            rec.message_post(body=_("Masofa hisoblandi: %(km).3f km × %(rate).0f so'm/km = %(sum).0f so'm") % {
-                "km": rec.distance_km, "rate": rate, "sum": rec.distance_amount
+        kms, errors = self._distance_km_bulk()
+        if len(self) == 1 and errors:
+            raise UserError(next(iter(errors.values())))
+        self._write_distances(kms, rate)
+        if len(self) == 1:
+            self.message_post(body=_("Masofa hisoblandi: %(km).3f km × %(rate).0f so'm/km = %(sum).0f so'm") % {
+                "km": self.distance_km, "rate": rate, "sum": self.distance_amount
             })
-        return True
-    
-    
-    def _load_products_from_partner_purchases(self, limit_per_partner=25):
-        SaleSync = self.env['product.sale.sync'].sudo()
-        for lead in self:
-            if not lead.partner_id:
-                continue
-            lines = SaleSync.search(
-                [('partner_id', '=', lead.partner_id.id)],
-                order='sale_date desc, id desc',
-                limit=limit_per_partner
+            # False, not True: the bulk server action hands the result to clean_action()
+            return False
+        # bulk mode: report instead of stopping on the first bad lead
+        message = _("Masofa hisoblandi: %(ok)s ta, xato: %(err)s ta.") % {"ok": len(kms), "err": len(errors)}
+        if errors:
+            names = dict(self.browse(list(errors)).mapped(lambda l: (l.id, l.service_number or l.name)))
+            message += "\n" + "\n".join(
+                f"{names.get(lid)}: {err}" for lid, err in list(errors.items())[:20]
             )
-            if not lines:
-                continue
-            seen = set()
-            commands = []
-            for ss in lines:
-                pid = ss.product_id.id if ss.product_id else False
-                if not pid or pid in seen:
-                    continue
-                seen.add(pid)
-                commands.append((0, 0, {
-                    'product_id': pid,
-                    'description': ss.name or ss.product_id.display_name,
-                    'quantity': 1.0,
-                    'price_unit': ss.price_unit or ss.product_id.list_price or 0.0,
-                    'sync_line_id': ss.id,
-                }))
+        return {
+            "type": "ir.actions.client",
+            "tag": "display_notification",
+            "params": {
+                "title": _("Masofa"),
+                "message": message,
+                "type": "warning" if errors else "success",
+                "sticky": bool(errors),
+            },
+        }
+
+
+    def _write_distances(self, kms, rate):
+        """{lead_id: km} -> distance_km / distance_amount in one UPDATE, checked as the calling user.
+
+        Every lead has its own value, so a grouped write() would still be one write per lead
+        through the whole crm.lead write stack; nothing depends on these two fields.
+        """
+        if not kms:
+            return
+        leads = self.browse(list(kms))
+        leads.check_access_rights("write")
+        leads.check_access_rule("write")
+        leads.flush_recordset(["distance_km", "distance_amount"])
+        rows = [(lead_id, round(km, 3), round(km * rate, 0)) for lead_id, km in kms.items()]
+        self.env.cr.execute(f"""
+            UPDATE crm_lead l
+               SET distance_km = v.km, distance_amount = v.amount,
+                   write_uid = %s, write_date = now() AT TIME ZONE 'UTC'
+              FROM (VALUES {", ".join(["(%s, %s::float8, %s::numeric)"] * len(rows))}) AS v(id, km, amount)
+             WHERE l.id = v.id
+        """, [self.env.uid] + [x for row in rows for x in row])
+        leads.invalidate_recordset(["distance_km", "distance_amount", "write_uid", "write_date"])
+
+    @api.model
+    def _partner_purchase_rows(self, partner_ids, limit_per_partner=25):
+        """{partner_id: [line vals, ...]} — latest ``limit_per_partner`` distinct products per partner, one query."""
+        res = {pid: [] for pid in partner_ids}
+        if not partner_ids:
+            return res
+        SaleSync = self.env["product.sale.sync"].sudo()
+        SaleSync.flush_model(["partner_id", "product_id", "name", "price_unit", "sale_date"])
+        self.env.cr.execute(f"""
+            SELECT partner_id, id, product_id, name, price_unit
+              FROM (
+                    SELECT d.*, row_number() OVER (PARTITION BY partner_id ORDER BY sale_date DESC, id DESC) AS rn
+                      FROM (
+                            SELECT DISTINCT ON (partner_id, product_id)
+                                   partner_id, id, product_id, name, price_unit, sale_date
+                              FROM {SaleSync._table}
+                             WHERE partner_id = ANY(%s) AND product_id IS NOT NULL
+                             ORDER BY partner_id, product_id, sale_date DESC, id DESC
+                      ) d
+              ) t
+             WHERE rn <= %s
+             ORDER BY partner_id, rn
+        """, (list(partner_ids), limit_per_partner))
+        rows = self.env.cr.fetchall()
+        products = self.env["product.product"].sudo().browse({r[2] for r in rows})
+        products.mapped("list_price")  # prefetch
+        for partner_id, sync_id, product_id, name, price_unit in rows:
+            product = products.browse(product_id)
+            res[partner_id].append({
+                "product_id": product_id,
+                "description": name or product.display_name,
+                "quantity": 1.0,
+                "price_unit": price_unit or product.list_price or 0.0,
+                "sync_line_id": sync_id,
+            })
+        return res
+
+    def _cached_partner_purchase_rows(self, partner_id, limit_per_partner):
+        """Onchange path: the same partner is picked again and again while typing."""
+        key = (self.env.cr.dbname, self.env.uid, partner_id, limit_per_partner)
+        now = time.monotonic()
+        hit = _PURCHASE_ROWS_CACHE.get(key)
+        if hit and hit[0] > now:
+            return hit[1]
+        rows = self._partner_purchase_rows([partner_id], limit_per_partner)[partner_id]
+        if len(_PURCHASE_ROWS_CACHE) >= PURCHASE_ROWS_MAX_KEYS:
+            _PURCHASE_ROWS_CACHE.clear()
+        _PURCHASE_ROWS_CACHE[key] = (now + PURCHASE_ROWS_TTL, rows)
+        return rows
+
+    def _load_products_from_partner_purchases(self, limit_per_partner=25, use_cache=False):
+        leads = self.filtered("partner_id")
+        if use_cache:
+            rows_by_partner = {
+                pid: self._cached_partner_purchase_rows(pid, limit_per_partner)
+                for pid in set(leads.partner_id.ids)
+            }
+        else:
+            rows_by_partner = self._partner_purchase_rows(leads.partner_id.ids, limit_per_partner)
+        for lead in leads:
+            commands = [(0, 0, dict(vals)) for vals in rows_by_partner.get(lead.partner_id.id) or ()]
             if commands:
                 if not lead.product_line_ids:
                     lead.product_line_ids = commands
@@ -429,17 +496,15 @@ class CrmLead(models.Model):
 
     @api.onchange("state_id", "region_id")
     def _onchange_location_filter_usta(self):
-        dom = [("is_usta", "=", True), ("active", "=", True)]
-        if self.region_id:
-            dom.append(("service_region_ids", "in", [self.region_id.id]))
-        elif self.state_id:
-            dom.append(("state_ids", "in", [self.state_id.id]))
+        Emp = self.env["cc.employee"]
+        by_region, by_state, _active = Emp._usta_region_map()
+        ids = Emp._ustalar_for_area(self.region_id.id, self.state_id.id)
         if self.usta_id:
-            if self.region_id and self.region_id not in self.usta_id.service_region_ids:
+            if self.region_id and self.usta_id.id not in by_region.get(self.region_id.id, ()):
                 self.usta_id = False
-            elif self.state_id and not self.region_id and self.state_id not in self.usta_id.state_ids:
+            elif self.state_id and not self.region_id and self.usta_id.id not in by_state.get(self.state_id.id, ()):
                 self.usta_id = False
-        return {"domain": {"usta_id": dom}}
+        return {"domain": {"usta_id": [("id", "in", sorted(ids))]}}
 
     @api.onchange('usta_id')
     def _check_usta_region_selected(self):
@@ -454,9 +519,10 @@ class CrmLead(models.Model):
 
     @api.constrains('usta_id', 'region_id')
     def _validate_usta_region(self):
+        by_region = self.env["cc.employee"]._usta_region_map()[0]
         for lead in self:
             if lead.usta_id and lead.region_id:
-                if lead.region_id not in lead.usta_id.service_region_ids:
+                if lead.usta_id.id not in by_region.get(lead.region_id.id, ()):
                     raise UserError(
                         f"Tanlangan usta ({lead.usta_id.name}) bu hudud ({lead.region_id.name}) uchun xizmat ko'rsatmaydi. "
                         f"Iltimos, boshqa ustani tanlang yoki ustaning ish hududini yangilang."
@@ -559,23 +625,40 @@ class CrmLead(models.Model):
             vals.setdefault("new_at", now)  # ✅ always set new_at
         leads = super(CrmLead, self).create(vals_list)
 
-        for lead in leads.sudo():
+        # company_id is only final after the ORM computed it (team > user > partner):
+        # reserve the numbers in one round per company, then one UPDATE for the batch
+        missing = {}
+        for lead in leads:
             if not lead.service_number:
-                num = lead._next_service_number_for_company(lead.company_id or self.env.company)
-                lead.with_context(skip_service_number=True).write({"service_number": num})
+                missing.setdefault(lead.company_id or self.env.company, []).append(lead.id)
+        numbers = {}
+        for company, lead_ids in missing.items():
+            numbers.update(zip(lead_ids, self._reserve_service_numbers(company, len(lead_ids))))
+        if numbers:
+            self.env.cr.execute(f"""
+                UPDATE crm_lead l SET service_number = v.num
+                  FROM (VALUES {", ".join(["(%s, %s)"] * len(numbers))}) AS v(id, num)
+                 WHERE l.id = v.id
+            """, [x for row in numbers.items() for x in row])
+            leads.invalidate_recordset(["service_number"])
         return leads
 
-    def _next_service_number_for_company(self, company):
-        Seq = self.env["ir.sequence"].with_company(company).sudo().search(
-            [("code", "=", SERVICE_SEQ_CODE)], limit=1
-        )
-        if not Seq:
+    @api.model
+    @tools.ormcache("company_id")
+    def _service_sequence_id(self, company_id):
+        Seq = self.env["ir.sequence"].sudo()
+        seq = Seq.search([("code", "=", SERVICE_SEQ_CODE), ("company_id", "=", company_id)], limit=1)
+        if not seq:
             # global sequence (company=False)
-            Seq = self.env["ir.sequence"].with_company(False).sudo().search(
-                [("code", "=", SERVICE_SEQ_CODE)], limit=1
-            )
-
-        if not Seq:
+            seq = Seq.search([("code", "=", SERVICE_SEQ_CODE), ("company_id", "=", False)], limit=1)
+        return seq.id
+
+    def _reserve_service_numbers(self, company, count):
+        """Return ``count`` consecutive service numbers taken from the sequence in one round trip."""
+        if count <= 0:
+            return []
+        seq = self.env["ir.sequence"].sudo().browse(self._service_sequence_id(company.id or False)).exists()
+        if not seq:
             # endi hech qanday fallback yo'q, to'g'ridan-to'g'ri xato
             raise UserError(
                 _(
@@ -585,14 +668,39 @@ class CrmLead(models.Model):
                 % SERVICE_SEQ_CODE
             )
 
-        num = Seq.next_by_code(SERVICE_SEQ_CODE)
-        if not num:
+        if seq.use_date_range:
+            # date-range sub-sequences keep their own counters: let ir.sequence handle them
+            numbers = [seq.with_company(company)._next() for _i in range(count)]
+        else:
+            cr = self.env.cr
+            if seq.implementation == "standard":
+                cr.execute(
+                    "SELECT nextval('ir_sequence_%03d') FROM generate_series(1, %%s)" % seq.id, (count,)
+                )
+                raw = [r[0] for r in cr.fetchall()]
+            else:
+                cr.execute(
+                    "SELECT number_next FROM ir_sequence WHERE id = %s FOR UPDATE NOWAIT", (seq.id,)
+                )
+                start = cr.fetchone()[0]
+                cr.execute(
+                    "UPDATE ir_sequence SET number_next = number_next + %s WHERE id = %s",
+                    (count * seq.number_increment, seq.id),
+                )
+                seq.invalidate_recordset(["number_next"])
+                raw = [start + i * seq.number_increment for i in range(count)]
+            prefix, suffix = seq.with_company(company)._get_prefix_suffix()
+            numbers = [prefix + "%%0%sd" % seq.padding % n + suffix for n in raw]
+
+        if not all(numbers):
             raise UserError(
                 _("Failed to generate a new service number from sequence '%s'.")
                 % SERVICE_SEQ_CODE
             )
+        return numbers
 
-        return num
+    def _next_service_number_for_company(self, company):
+        return self._reserve_service_numbers(company, 1)[0]
 
     
     def _get_client_phone_for_sms(self):
@@ -646,12 +754,8 @@ class CrmLead(models.Model):
         return text
 
     def _send_warranty_register_sms(self):
-        """Murojaat ro'yxatdan o'tganda mijozga sms yuborish (Eskiz orqali)."""
-        ICP = self.env["ir.config_parameter"].sudo()
-        use_odoo_sms = (ICP.get_param("crm_rating_sms.use_odoo_sms") or "0") == "1"
-        use_my_eskiz = (ICP.get_param("crm_rating_sms.use_my_eskiz") or "0").lower() in ("1", "true", "yes")
-        debug = self._is_debug()
-
+        """Murojaat ro'yxatdan o'tganda mijozga sms navbatga qo'yiladi (crm.lead.sms.queue, cron yuboradi)."""
+        items = []
         for lead in self:
             if lead.warranty_sms_sent:
                 continue
@@ -661,119 +765,47 @@ class CrmLead(models.Model):
                 lead.message_post(body=_("Warranty SMS: mijoz telefoni topilmadi."))
                 continue
 
-            text = lead._build_warranty_register_text()
-
-            # --- faqat ichki note rejimi (debug/odoo sms) ---
-            if use_odoo_sms:
-                lead.message_post(body=_("Warranty SMS (note-only): %s -> %s") % (phone12, text))
-                lead.warranty_sms_sent = True
-                continue
-
-            # --- my.eskiz.uz varianti (Bearer token bilan) ---
-            if use_my_eskiz:
-                base = (ICP.get_param("crm_rating_sms.my_eskiz_base") or "https://my.eskiz.uz/api").rstrip("/")
-                url = f"{base}/message/sms/send"
-                token = (ICP.get_param("crm_rating_sms.my_eskiz_token") or "").strip()
-                sender = (ICP.get_param("crm_rating_sms.my_eskiz_from") or ICP.get_param("crm_rating_sms.sender") or "4546").strip()
-
-                if not (token and sender):
-                    msg = "Warranty SMS (my.eskiz): token yoki sender sozlanmagan."
-                    lead.message_post(body=_(msg))
-                    continue
-
-                payload = {
-                    "mobile_phone": phone12,
-                    "message": text,
-                    "from": sender,
-                }
-                headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
-
-                try:
-                    r = requests.post(url, json=payload, headers=headers, timeout=20)
-                    js = {}
-                    try:
-                        js = r.json()
-                    except Exception:
-                        js = {"status": f"http {r.status_code}", "body": r.text}
-
-                    status_str = str(js.get("status") or "").lower()
-                    if r.status_code == 200 and status_str in ("success", "ok", "accepted", "waiting"):
-                        lead.warranty_sms_sent = True
-                        lead.message_post(
-                            body=_("Warranty SMS yuborildi (my.eskiz): %s") % (phone12,)
-                        )
-                    else:
-                        lead.message_post(
-                            body=_("Warranty SMS (my.eskiz) yuborilmadi: %s") % (str(js)[:500],)
-                        )
-                except Exception as e:
-                    lead.message_post(
-                        body=_("Warranty SMS (my.eskiz) xatolik: %s") % (str(e)[:500],)
-                    )
-                continue
-
-            # --- notify.eskiz.uz (eskiz_sms kutubxonasi) ---
-            try:
-                eskiz = self._eskiz_client()
-                sender = ICP.get_param("crm_rating_sms.sender", "4546")
-                callback = ICP.get_param("crm_rating_sms.callback_url") or None
-
-                def _do_send():
-                    return eskiz.send_sms(
-                        phone12,
-                        message=text,
-                        from_whom=sender,
-                        callback_url=callback,
-                    )
-
-                try:
-                    resp = _do_send()
-                except BadRequest:
-                    # token eskirgan bo'lishi mumkin – yana bir marta urinib ko'ramiz
-                    try:
-                        eskiz.token.set("")
-                    except Exception:
-                        pass
-                    resp = _do_send()
-
-                resp_dict = {
-                    "id": getattr(resp, "id", None),
-                    "status": getattr(resp, "status", None),
-                    "message": getattr(resp, "message", None),
-                    "data": getattr(resp, "data", None),
-                }
-                status = str(resp_dict.get("status") or "").lower()
-                msg_id = (
-                    resp_dict.get("id")
-                    or ((resp_dict.get("data") or {}) or {}).get("message_id")
-                )
-                ok = bool(msg_id) or status in ("ok", "success", "waiting", "accepted")
-
-                if ok:
-                    lead.warranty_sms_sent = True
-                    lead.message_post(
-                        body=_("Mijozga Service yaratildi SMS yuborildi (notify.eskiz)")
-                    )
-                else:
-                    err = resp_dict.get("message") or resp_dict or "Unknown provider response"
-                    lead.message_post(
-                        body=_("Warranty SMS yuborilmadi: %s") % (str(err)[:500],)
-                    )
-            except Exception as e:
-                lead.message_post(
-                    body=_("Warranty SMS yuborilmadi (exception): %s") % (str(e)[:500],)
-                )
+            items.append((lead, phone12, lead._build_warranty_register_text()))
+        self.env["crm.lead.sms.queue"]._enqueue(items)
 
 
 
+    # ==== Stage transition engine ====
+    # The single write() override for crm.lead: derived values for the whole recordset are
+    # computed up front, applied in one grouped write per distinct value set (under
+    # TRANSITION_GUARD, so nested writes skip this engine), then side effects run.
+    # Other files hook in through _write_before() / _write_after() instead of overriding
+    # write(), so the records are snapshotted once per call and not once per override.
     def write(self, vals):
-        # 1) super
+        ctx = self.env.context
+        if ctx.get(TRANSITION_GUARD):
+            return super(CrmLead, self).write(vals)
+
+        hooks_before = self._write_before(vals)
+        stage_changed = "stage_id" in vals
+        watch_notify = stage_changed or "probability" in vals
+        before = {
+            r.id: (r.stage_id.id, self._is_new_stage_now(r), self._is_won_now(r))
+            for r in self
+        } if watch_notify else {}
+
         res = super(CrmLead, self).write(vals)
-        
-        
-        if "qayta_zayavka" in vals and vals.get("qayta_zayavka"):
+        leads = self.sudo()
+        now = fields.Datetime.now()
+        roles = self.env["crm.stage"]._stage_role_map()
+
+        # 1) derived values (service numbers are assigned in create())
+        updates = {lead.id: {} for lead in leads}
+        if stage_changed:
+            for lead in leads:
+                updates[lead.id].update(lead._stage_transition_values(roles.get(lead.stage_id.id), now))
+        leads._write_grouped(updates)
+        self._write_after(vals, hooks_before)
+
+        # 2) side effects
+        if vals.get("qayta_zayavka"):
             Finance = self.env["cc.finance"].sudo()
-            for lead in self.sudo():
+            for lead in leads:
                 fin = Finance.search([
                     ("lead_id", "=", lead.id),
                     ("state", "!=", "cancelled"),
@@ -782,112 +814,116 @@ class CrmLead(models.Model):
                     fin.write({"state": "cancelled"})
                     lead.message_post(body=_("Qayta zayavka ON: mavjud finance yozuvlari CANCEL qilindi."))
 
-
-        # 2) fill service # if missing
-        if not self.env.context.get("skip_service_number"):
-            for lead in self.sudo().filtered(lambda l: not l.service_number):
-                num = lead._next_service_number_for_company(lead.company_id or self.env.company)
-                lead.with_context(skip_service_number=True).write({"service_number": num})
-
-        # 3) stage-based timeline; KPI NI ENDI TASDIQLANDI DA BERAMIZ
-        if "stage_id" in vals:
-            now = fields.Datetime.now()
-
-            for lead in self.sudo():
-                stage_name = (lead.stage_id.name or "").lower()
-                updates = {}
-
-                # ✅ Safety: if new_at is missing for any reason, set it ASAP
-                if not lead.new_at:
-                    updates["new_at"] = now
-
-                is_new = any(k in stage_name for k in ("yangi", "new", "draft", "assigned"))
-                is_accept = any(k in stage_name for k in ("qabul", "waiting", "kutil"))
-                is_start = any(k in stage_name for k in ("jarayon", "progress"))
-                is_finish = any(k in stage_name for k in ("yakun", "done", "finish"))
-                is_confirm = any(k in stage_name for k in ("tasdiq", "confirm"))
-
-                # NEW stage capture (only first time)
-                if is_new and not lead.new_at:
-                    updates["new_at"] = now
-
-                # ACCEPT capture + section time New→Accept
-                if is_accept and not lead.accept_at:
-                    updates["accept_at"] = now
-                    start_new = lead.new_at or updates.get("new_at") or lead.create_date
-                    if start_new:
-                        updates["new_to_accept_hours"] = round((now - start_new).total_seconds() / 3600.0, 2)
-
-                # START capture + section time Accept→Start
-                if is_start and not lead.start_at:
-                    updates.setdefault("accept_at", lead.accept_at or now)  # keep accept if already exists
-                    updates["start_at"] = now
-
-                    a = lead.accept_at or updates.get("accept_at")
-                    if a:
-                        updates["accept_to_start_hours"] = round((now - a).total_seconds() / 3600.0, 2)
-
-                    # also compute New→Start if you want (optional)
-
-                # FINISH capture + section time Start→Finish + totals
-                if is_finish:
-                    if not lead.finish_at:
-                        updates["finish_at"] = now
-
-                    f = updates.get("finish_at") or lead.finish_at or now
-                    s = lead.start_at or updates.get("start_at")
-                    a = lead.accept_at or updates.get("accept_at")
-                    n = lead.new_at or updates.get("new_at") or lead.create_date
-
-                    if s:
-                        updates["start_to_finish_hours"] = round((f - s).total_seconds() / 3600.0, 2)
-
-                    # ✅ total New→Finish (this is what you wanted instead of accept/progress fallback)
-                    if n:
-                        updates["total_to_finish_hours"] = round((f - n).total_seconds() / 3600.0, 2)
-                        updates["work_time_spent"] = updates["total_to_finish_hours"]  # keep your existing field meaningful
-
-                if updates:
-                    lead.with_context(skip_service_number=True).sudo().write(updates)
-
-
-                if is_confirm:
-                    # ensure finish exists before confirm timing
-                    f = lead.finish_at or now
-                    n = lead.new_at or lead.create_date
-
-                    if lead.finish_at:
-                        lead.sudo().write({
-                            "finish_to_confirm_hours": round((now - f).total_seconds() / 3600.0, 2),
-                            "total_to_confirm_hours": round((now - n).total_seconds() / 3600.0, 2) if n else 0.0,
-                        })
-
-                    # ✅ If qayta zayavka: do NOT give KPI or any bonus finance
-                    if lead.finish_at and lead.qayta_zayavka:
-                        lead.message_post(
-                            body=_("Qayta zayavka ON: Tasdiqlashda KPI/bonus/finance hisoblanmadi."),
-                            subtype_xmlid="mail.mt_note"
-                        )
-                    elif lead.finish_at:
-                        self.env["cc.kpi.result"].sudo().upsert_time_from_lead(lead)
-                        lead._apply_olov_bonus_if_applicable()
-
-                # Warranty SMS block (keep as you already have)
-                try:
-                    leads_for_sms = self.sudo().filtered(
-                        lambda l: not l.warranty_sms_sent
-                        and l.service_number
-                        and l.usta_id
-                        and "qabul" in (l.stage_id.name or "").lower()
+        if stage_changed:
+            self.env["crm.lead.stage.event"]._log_transitions(
+                [(lead.id, before[lead.id][0], lead.stage_id.id) for lead in leads]
+            )
+            # KPI NI ENDI TASDIQLANDI DA BERAMIZ
+            for lead in leads.filtered(lambda l: roles.get(l.stage_id.id) == "confirm" and l.finish_at):
+                # ✅ If qayta zayavka: do NOT give KPI or any bonus finance
+                if lead.qayta_zayavka:
+                    lead.message_post(
+                        body=_("Qayta zayavka ON: Tasdiqlashda KPI/bonus/finance hisoblanmadi."),
+                        subtype_xmlid="mail.mt_note"
                     )
-                    if leads_for_sms:
-                        leads_for_sms._send_warranty_register_sms()
-                except Exception:
-                    pass
+                else:
+                    self.env["cc.kpi.result"].sudo().upsert_time_from_lead(lead)
+                    lead._apply_olov_bonus_if_applicable()
+
+            leads_for_sms = leads.filtered(
+                lambda l: not l.warranty_sms_sent
+                and l.service_number
+                and l.usta_id
+                and roles.get(l.stage_id.id) == "accept"
+            )
+            if leads_for_sms:
+                leads_for_sms._send_warranty_register_sms()
 
+        if watch_notify:
+            if not ctx.get("__skip_new_notify__"):
+                newly_new = leads.filtered(
+                    lambda r: not r.notify_new_sent and self._is_new_stage_now(r) and not before[r.id][1]
+                )
+                if newly_new:
+                    newly_new._send_usta_new_telegram()
+            if not ctx.get("__skip_won_notify__"):
+                newly_won = leads.filtered(
+                    lambda r: not r.notify_won_sent and self._is_won_now(r) and not before[r.id][2]
+                )
+                if newly_won:
+                    newly_won._send_usta_won_telegram()
 
         return res
 
+    def _write_before(self, vals):
+        """Hook: capture what _write_after() needs before ``vals`` is written; returns a dict."""
+        return {}
+
+    def _write_after(self, vals, before):
+        """Hook: react to ``vals`` once it is written (derived values included).
+
+        Runs once per write() call; grouped derived-value writes (TRANSITION_GUARD) skip it,
+        they only touch timing fields.
+        """
+
+    def _stage_transition_values(self, role, now):
+        """Timestamps and section hours to store when the lead enters a stage with ``role``."""
+        self.ensure_one()
+        hours = lambda a, b: round((b - a).total_seconds() / 3600.0, 2)
+        updates = {"stage_entered_dt": now}
+
+        # ✅ Safety: if new_at is missing for any reason, set it ASAP
+        if not self.new_at:
+            updates["new_at"] = now
+        n = self.new_at or updates.get("new_at") or self.create_date
+
+        # ACCEPT capture + section time New→Accept
+        if role == "accept":
+            if not self.accept_at:
+                updates["accept_at"] = now
+                if n:
+                    updates["new_to_accept_hours"] = hours(n, now)
+            if not self.accepted_dt:
+                updates["accepted_dt"] = now
+
+        # START capture + section time Accept→Start
+        if role == "progress" and not self.start_at:
+            a = self.accept_at or now  # keep accept if already exists
+            updates["accept_at"] = a
+            updates["start_at"] = now
+            updates["accept_to_start_hours"] = hours(a, now)
+
+        # FINISH capture + section time Start→Finish + totals
+        if role == "done":
+            f = self.finish_at or now
+            if not self.finish_at:
+                updates["finish_at"] = f
+            if self.start_at:
+                updates["start_to_finish_hours"] = hours(self.start_at, f)
+            # ✅ total New→Finish
+            if n:
+                updates["total_to_finish_hours"] = hours(n, f)
+                updates["work_time_spent"] = updates["total_to_finish_hours"]  # keep your existing field meaningful
+
+        # CONFIRM: section time Finish→Confirm + total
+        if role == "confirm" and self.finish_at:
+            updates["finish_to_confirm_hours"] = hours(self.finish_at, now)
+            updates["total_to_confirm_hours"] = hours(n, now) if n else 0.0
+
+        if role in WORK_DONE_ROLES or self.stage_id.is_won:
+            updates["completed_dt"] = now
+        return updates
+
+    def _write_grouped(self, updates):
+        """updates: {lead_id: vals}; one write() per distinct vals, under the recursion guard."""
+        groups = {}
+        for lead_id, lead_vals in updates.items():
+            if lead_vals:
+                groups.setdefault(tuple(sorted(lead_vals.items())), []).append(lead_id)
+        guarded = self.with_context(**{TRANSITION_GUARD: True}).sudo()
+        for key, ids in groups.items():
+            guarded.browse(ids).write(dict(key))
+
     contact_display = fields.Char(compute="_compute_contact_display", string="Kontakt nomi", store=False)
 
     @api.depends("partner_name","partner_id.display_name","contact_name","phone","mobile","email_from")
@@ -930,74 +966,105 @@ class CrmLead(models.Model):
         sanitize=False
     )
 
-    @api.depends(
-        "voice_attachment_ids", "voice_attachment_ids.mimetype",
-        "message_attachment_count", "write_date"
-    )
+    def _voice_attachments_by_lead(self):
+        """{lead_id: ((att_id, name, checksum), ...)} — voice field + chatter audio, one query."""
+        ids = [i for i in self.ids if i]
+        res = {lid: () for lid in ids}
+        if not ids:
+            return res
+        self.env["ir.attachment"].flush_model(["res_model", "res_id", "mimetype", "name", "checksum"])
+        self.flush_model(["voice_attachment_ids"])
+        self.env.cr.execute("""
+            SELECT DISTINCT ON (src.lead_id, a.id) src.lead_id, a.id, a.name, a.checksum, src.pos
+              FROM (
+                    SELECT lead_id, attachment_id, 0 AS pos FROM crm_lead_voice_rel WHERE lead_id = ANY(%(ids)s)
+                     UNION ALL
+                    SELECT res_id, id, 1 FROM ir_attachment
+                     WHERE res_model = 'crm.lead' AND res_id = ANY(%(ids)s) AND mimetype LIKE 'audio/%%'
+              ) src
+              JOIN ir_attachment a ON a.id = src.attachment_id
+             WHERE a.mimetype LIKE 'audio/%%'
+             ORDER BY src.lead_id, a.id, src.pos
+        """, {"ids": ids})
+        rows = {}
+        for lead_id, att_id, name, checksum, pos in self.env.cr.fetchall():
+            rows.setdefault(lead_id, []).append((pos, att_id, name, checksum))
+        for lead_id, items in rows.items():
+            # voice field first, then chatter, each in upload order
+            res[lead_id] = tuple((att_id, name, checksum) for _pos, att_id, name, checksum in sorted(items))
+        return res
+
+    @staticmethod
+    def _render_voice_gallery(items):
+        # Har doim ildiz <div> bo‘lsin:
+        html = [
+            """<style>
+            .cl-audio-list{display:flex;flex-direction:column;gap:8px}
+            .cl-audio-item{padding:8px;border:1px solid #e5e7eb;border-radius:8px;background:#fafafa}
+            .cl-audio-name{font-size:12px;color:#475569;margin-bottom:4px;word-break:break-all}
+            </style>""",
+            '<div class="cl-audio-list">'
+        ]
+        for att_id, name, checksum in items:
+            # range-capable route: long recordings start playing before the whole file is loaded
+            url = f"{VOICE_ROUTE}/{att_id}?unique={checksum or ''}"
+            title = html_escape(name or "")
+            html.append(
+                f'<div class="cl-audio-item">'
+                f'  <div class="cl-audio-name">{title}</div>'
+                f'  <audio controls preload="metadata" src="{url}"></audio>'
+                f'</div>'
+            )
+        # bo‘sh bo‘lsa ham yopuvchi div bor
+        html.append("</div>")
+        return "".join(html)
+
+    @api.depends("voice_attachment_ids")
     def _compute_voice_gallery_html(self):
-        Att = self.env["ir.attachment"].sudo()
+        by_lead = self._origin._voice_attachments_by_lead()
         for rec in self:
-            auds = (rec.voice_attachment_ids or self.env["ir.attachment"]).filtered(
-                lambda a: (a.mimetype or "").startswith("audio/")
-            )
-            chatter_auds = Att.search([
-                ("res_model", "=", "crm.lead"),
-                ("res_id", "=", rec.id or 0),
-                ("mimetype", "ilike", "audio")
-            ])
-            seen, ordered = set(), []
-            for a in list(auds) + list(chatter_auds):
-                if a.id not in seen:
-                    seen.add(a.id); ordered.append(a)
-
-            # Har doim ildiz <div> bo‘lsin:
-            html = [
-                """<style>
-                .cl-audio-list{display:flex;flex-direction:column;gap:8px}
-                .cl-audio-item{padding:8px;border:1px solid #e5e7eb;border-radius:8px;background:#fafafa}
-                .cl-audio-name{font-size:12px;color:#475569;margin-bottom:4px;word-break:break-all}
-                </style>""",
-                '<div class="cl-audio-list">'
-            ]
-            if ordered:
-                for att in ordered:
-                    url = f"/web/content/{att.id}?download=false"
-                    title = (att.name or "").replace('"', "&quot;")
-                    html.append(
-                        f'<div class="cl-audio-item">'
-                        f'  <div class="cl-audio-name">{title}</div>'
-                        f'  <audio controls preload="none" src="{url}"></audio>'
-                        f'</div>'
-                    )
-            # bo‘sh bo‘lsa ham yopuvchi div bor
-            html.append("</div>")
-            rec.voice_gallery_html = "".join(html)
+            items = by_lead.get(rec._origin.id, ())
+            if isinstance(rec.id, models.NewId):
+                # unsaved form: the voice field lives in the cache, chatter audio in the DB
+                voice = rec.voice_attachment_ids.filtered(lambda a: (a.mimetype or "").startswith("audio/"))
+                stored = set(rec._origin.voice_attachment_ids.ids) | set(voice._origin.ids)
+                items = tuple((a._origin.id, a.name, a.checksum) for a in voice) + tuple(
+                    item for item in items if item[0] not in stored
+                )
+            rec.voice_gallery_html = self._render_voice_gallery(items)
 
 
     def _map_partner_city_to_cc_region(self, partner):
         """partner.district_id (cc.region) yoki city/city_id bo'yicha region topadi."""
-        Region = self.env["cc.region"].sudo()
-
-        # 0) YANGI: agar partner.district_id bo'lsa – bevosita shu region
-        if hasattr(partner, "district_id") and partner.district_id:
-            return partner.district_id
-
-        # 1) Agar boshqa joylarda res.city_id ishlatilayotgan bo'lsa – fallback
-        if hasattr(partner, "city_id") and partner.city_id:
-            return Region.search([
-                ("name", "ilike", partner.city_id.name or ""),
-                ("state_id", "=", partner.city_id.state_id.id or False),
-            ], limit=1)
-
-        # 2) Matnli city → cc.region
-        city_name = (partner.city or "").strip()
-        if city_name:
-            dom = [("name", "ilike", city_name)]
-            if partner.state_id:
-                dom.append(("state_id", "=", partner.state_id.id))
-            return Region.search(dom, limit=1)
+        region_id = self._map_partners_to_cc_region(partner)[partner.id]
+        return self.env["cc.region"].sudo().browse(region_id)
 
-        return self.env["cc.region"]
+    @api.model
+    def _map_partners_to_cc_region(self, partners):
+        """{partner_id: cc.region id or False} for many partners at once (imports, mass actions).
+
+        Order per partner: district_id, then city_id / city text matched on the normalized,
+        transliterated region-name index of its state — no cc.region query per partner.
+        """
+        res, pending = {}, []
+        has_district = "district_id" in partners._fields
+        has_city_id = "city_id" in partners._fields
+        for partner in partners:
+            # 0) YANGI: agar partner.district_id bo'lsa – bevosita shu region
+            if has_district and partner.district_id:
+                res[partner.id] = partner.district_id.id
+            # 1) Agar boshqa joylarda res.city_id ishlatilayotgan bo'lsa – fallback
+            elif has_city_id and partner.city_id:
+                pending.append((partner.id, partner.city_id.name, partner.city_id.state_id.id))
+            # 2) Matnli city → cc.region
+            elif (partner.city or "").strip():
+                pending.append((partner.id, partner.city, partner.state_id.id))
+            else:
+                res[partner.id] = False
+        matched = self.env["cc.region"]._match_region_names([(name, state) for _pid, name, state in pending])
+        for (pid, _name, _state), region_id in zip(pending, matched):
+            res[pid] = region_id
+        return res
 
     @api.onchange("partner_id")
     def _onchange_partner_auto_geo(self):
@@ -1064,3 +1131,21 @@ class CrmLead(models.Model):
         return vals
 
 
+
+
+class IrSequence(models.Model):
+    _inherit = "ir.sequence"
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        res = super().create(vals_list)
+        if any(v.get("code") == SERVICE_SEQ_CODE for v in vals_list):
+            self.env.registry.clear_cache()  # crm.lead._service_sequence_id
+        return res
+
+    def write(self, vals):
+        touched = any(s.code == SERVICE_SEQ_CODE for s in self)
+        res = super().write(vals)
+        if touched or vals.get("code") == SERVICE_SEQ_CODE:
+            self.env.registry.clear_cache()
+        return res
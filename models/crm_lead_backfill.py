@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+import logging
+import time
+
+from odoo import api, models, _
+
+from .crm_lead_stage_event import PARAM_BACKFILL_CURSOR as PARAM_EVENT_CURSOR, PARAM_EVENTS_SINCE
+
+_logger = logging.getLogger(__name__)
+
+BACKFILL_KINDS = ("service_number", "timing")
+# section hours of _stage_transition_values(), in SQL: (field, from stamp, to stamp)
+TIMING_HOURS = (
+    ("new_to_accept_hours", "n", "a"),
+    ("accept_to_start_hours", "COALESCE(a, s)", "s"),
+    ("start_to_finish_hours", "s", "f"),
+    ("total_to_finish_hours", "n", "f"),
+    ("finish_to_confirm_hours", "f", "c"),
+    ("total_to_confirm_hours", "n", "CASE WHEN f IS NOT NULL THEN c END"),
+)
+PARAM_BACKFILL_CURSOR = "crm_office_ui.backfill_cursor.%s"
+
+
+class CrmLeadBackfill(models.Model):
+    _inherit = "crm.lead"
+
+    @api.model
+    def _backfill_run(self, kinds=BACKFILL_KINDS, chunk_size=1000, time_budget=None, commit=True):
+        """Fill data that older versions left empty, chunk by chunk with bulk UPDATEs.
+
+        Each kind keeps its last processed lead id in PARAM_BACKFILL_CURSOR, committed with
+        the chunk, so an interrupted run continues where it stopped. Leads at or below the
+        cursor are done for good (new leads get their values live), so a finished kind only
+        looks at newer leads on later runs. Returns {kind: rows}.
+        """
+        deadline = time.monotonic() + time_budget if time_budget else None
+        done = {}
+        for kind in kinds:
+            if deadline and time.monotonic() >= deadline:
+                break
+            done[kind] = getattr(self, f"_backfill_{kind}")(chunk_size, deadline, commit)
+        return done
+
+    @api.model
+    def _cron_backfill(self, time_budget=240):
+        return self._backfill_run(time_budget=time_budget)
+
+    @api.model
+    def _action_backfill(self):
+        """Server action entry point: wakes the backfill cron up instead of running in the request
+        (a long pass with intermediate commits would outlive limit_time_real)."""
+        self.env.ref("crm_office_ui.ir_cron_crm_lead_backfill")._trigger()
+        return {
+            "type": "ir.actions.client",
+            "tag": "display_notification",
+            "params": {
+                "title": _("Backfill"),
+                "message": _("Started in the background; progress is in the server log."),
+                "sticky": False,
+            },
+        }
+
+    def _backfill_chunks(self, kind, where, chunk_size, deadline, commit, params=()):
+        """Yield id lists of crm_lead rows matching ``where``, resuming from the stored cursor."""
+        ICP = self.env["ir.config_parameter"].sudo()
+        param = PARAM_BACKFILL_CURSOR % kind
+        cursor = int(ICP.get_param(param) or 0)
+        cr = self.env.cr
+        cr.execute(f"SELECT count(*) FROM crm_lead WHERE id > %s AND {where}", (cursor, *params))
+        remaining = cr.fetchone()[0]
+        processed = 0
+        while not (deadline and time.monotonic() >= deadline):
+            cr.execute(
+                f"SELECT id FROM crm_lead WHERE id > %s AND {where} ORDER BY id LIMIT %s",
+                (cursor, *params, chunk_size),
+            )
+            ids = [r[0] for r in cr.fetchall()]
+            if not ids:
+                break
+            yield ids
+            cursor = ids[-1]
+            processed += len(ids)
+            ICP.set_param(param, str(cursor))
+            if commit:
+                cr.commit()
+            _logger.info("crm.lead backfill %s: %s/%s, cursor %s", kind, processed, remaining, cursor)
+        ICP.set_param(param, str(cursor))
+        if commit:
+            cr.commit()
+
+    def _backfill_service_number(self, chunk_size, deadline, commit):
+        cr = self.env.cr
+        Company = self.env["res.company"]
+        total = 0
+        # Only Servis leads missing a number (new leads are numbered in create())
+        where = "category_type = 'servis' AND service_number IS NULL"
+        for ids in self._backfill_chunks("service_number", where, chunk_size, deadline, commit):
+            cr.execute("SELECT id, company_id FROM crm_lead WHERE id = ANY(%s) ORDER BY id", (ids,))
+            by_company = {}
+            for lead_id, company_id in cr.fetchall():
+                by_company.setdefault(company_id, []).append(lead_id)
+            rows = []
+            for company_id, lead_ids in by_company.items():
+                company = Company.browse(company_id) if company_id else self.env.company
+                rows += zip(lead_ids, self._reserve_service_numbers(company, len(lead_ids)))
+            values = ", ".join(["(%s, %s)"] * len(rows))
+            cr.execute(f"""
+                UPDATE crm_lead l SET service_number = v.num
+                  FROM (VALUES {values}) AS v(id, num)
+                 WHERE l.id = v.id AND l.service_number IS NULL
+            """, [x for row in rows for x in row])
+            total += cr.rowcount
+        self.invalidate_model(["service_number"])
+        return total
+
+    def _backfill_timing(self, chunk_size, deadline, commit):
+        """new_at from create_date; accept/start/finish (and confirm) from the first matching
+        stage event, and the section hours between them, all in one UPDATE per chunk.
+
+        Cancelled or rejected leads never get every stamp, which is why the cursor is not
+        rewound. It also stops before the first lead whose chatter history is not imported
+        into crm.lead.stage.event yet, so those are not passed over with empty stamps.
+        """
+        cr = self.env.cr
+        self.env["crm.lead.stage.event"].flush_model()
+        ICP = self.env["ir.config_parameter"].sudo()
+        since = ICP.get_param(PARAM_EVENTS_SINCE)
+        upto = None
+        if since:
+            cr.execute(
+                "SELECT min(id) FROM crm_lead WHERE id > %s AND create_date < %s",
+                (int(ICP.get_param(PARAM_EVENT_CURSOR) or 0), since),
+            )
+            upto = cr.fetchone()[0]
+        hour_fields = [name for name, _a, _b in TIMING_HOURS]
+        where = "(new_at IS NULL OR accept_at IS NULL OR start_at IS NULL OR finish_at IS NULL OR %s)" % (
+            " OR ".join(f"{name} IS NULL" for name in hour_fields)
+        )
+        params = ()
+        if upto:
+            where += " AND id < %s"
+            params = (upto,)
+        hours = {
+            name: f"COALESCE(l.{name}, round((extract(epoch FROM ({b}) - ({a})) / 3600.0)::numeric, 2))"
+            for name, a, b in TIMING_HOURS
+        }
+        columns = ["new_at", "accept_at", "start_at", "finish_at"] + hour_fields + ["work_time_spent"]
+        total = 0
+        for ids in self._backfill_chunks("timing", where, chunk_size, deadline, commit, params):
+            cr.execute(f"""
+                WITH e AS (
+                    SELECT ids.lead_id,
+                           min(ev.date) FILTER (WHERE s.stage_role = 'accept') AS accept_at,
+                           min(ev.date) FILTER (WHERE s.stage_role = 'progress') AS start_at,
+                           min(ev.date) FILTER (WHERE s.stage_role = 'done') AS finish_at,
+                           min(ev.date) FILTER (WHERE s.stage_role = 'confirm') AS confirm_at
+                      FROM unnest(%s::int[]) AS ids(lead_id)
+                      LEFT JOIN crm_lead_stage_event ev USING (lead_id)
+                      LEFT JOIN crm_stage s ON s.id = ev.to_stage_id
+                     GROUP BY ids.lead_id
+                ), t AS (
+                    SELECT l.id,
+                           COALESCE(l.new_at, l.create_date) AS n,
+                           COALESCE(l.accept_at, e.accept_at) AS a,
+                           COALESCE(l.start_at, e.start_at) AS s,
+                           COALESCE(l.finish_at, e.finish_at) AS f,
+                           e.confirm_at AS c
+                      FROM crm_lead l JOIN e ON e.lead_id = l.id
+                ), v AS (
+                    SELECT l.id, t.n, t.a, t.s, t.f,
+                           {", ".join(f"{expr} AS {name}" for name, expr in hours.items())}
+                      FROM crm_lead l JOIN t ON t.id = l.id
+                )
+                UPDATE crm_lead l
+                   SET new_at = v.n, accept_at = v.a, start_at = v.s, finish_at = v.f,
+                       {", ".join(f"{name} = v.{name}" for name in hour_fields)},
+                       work_time_spent = COALESCE(l.work_time_spent, v.total_to_finish_hours)
+                  FROM v
+                 WHERE l.id = v.id
+                   AND ({", ".join(f"l.{c}" for c in columns)}) IS DISTINCT FROM
+                       (v.n, v.a, v.s, v.f, {", ".join(f"v.{name}" for name in hour_fields)},
+                        COALESCE(l.work_time_spent, v.total_to_finish_hours))
+            """, (ids,))
+            total += cr.rowcount
+        self.invalidate_model(columns)
+        return total
@@ -2,13 +2,12 @@
 # -*- coding: utf-8 -*-
 from odoo import api, fields, models
 
-_ACCEPT_KEYS  = ("qabul", "accept")
-_DONE_KEYS    = ("ish yakunlandi", "yakun", "tasdiq", "finished", "done", "won")
+from .crm_stage_role import WORK_DONE_ROLES
 
 class CrmLead(models.Model):
     _inherit = "crm.lead"
 
-    # stamps + badge for current stage
+    # stamps + badge for current stage (written by the transition engine in crm_lead.py)
     stage_entered_dt = fields.Datetime(copy=False, readonly=True)
     stage_elapsed_badge = fields.Char(compute="_compute_stage_elapsed_badge", store=False)
 
@@ -47,36 +46,14 @@ class CrmLead(models.Model):
             secs = (to_dt(now) - to_dt(base)).total_seconds() if base else 0.0
             rec.stage_elapsed_badge = self._fmt_badge_from_seconds(secs)
 
-    def _stage_timeline_from_history(self):
-        """[(dt, stage_name_lower), ...] oldest→newest incl. 'now/current' closure."""
-        self.ensure_one()
-        Message = self.env["mail.message"].sudo()
-        msgs = Message.search([("model", "=", "crm.lead"), ("res_id", "=", self.id)],
-                              order="date asc, id asc")
-        timeline = []
-        for msg in msgs:
-            for tv in (msg.tracking_value_ids or []):
-                fname = (getattr(tv, "field", None)
-                         or getattr(tv, "field_name", None)
-                         or getattr(tv, "field_desc", None) or "")
-                if str(fname).strip().lower() not in ("stage_id", "stage"):
-                    continue
-                name = (getattr(tv, "new_value_char", "") or "").strip()
-                if not name and getattr(tv, "new_value", None):
-                    name = str(tv.new_value).split(",")[0].strip()
-                if not name:
-                    continue
-                dt = msg.date or msg.create_date
-                if dt:
-                    timeline.append((dt, name.lower()))
-        if self.stage_id and self.stage_id.name:
-            timeline.append((fields.Datetime.now(), (self.stage_id.name or "").lower()))
-        return timeline
-
     @api.depends("accepted_dt", "completed_dt", "stage_id")
     def _compute_work_duration_core(self):
         """Compute total seconds from first Accept to first Done."""
         to_dt = fields.Datetime.to_datetime
+        # one crm.lead.stage.event query for every lead that lacks stamps
+        timelines = self.env["crm.lead.stage.event"]._timelines(
+            self.filtered(lambda r: not (r.accepted_dt and r.completed_dt))
+        )
         for rec in self:
             # Fast path if we have stamps
             if rec.accepted_dt and rec.completed_dt:
@@ -85,21 +62,21 @@ class CrmLead(models.Model):
                     (to_dt(rec.completed_dt) - to_dt(rec.accepted_dt)).total_seconds(),
                 )
                 continue
-            # Fallback: rebuild from chatter
+            # Fallback: rebuild from the stage event log (chatter history for unmigrated leads)
             secs = 0.0
-            tl = rec._stage_timeline_from_history()
+            tl = timelines.get(rec.id)
             if tl:
                 started = None
                 last_dt = None
-                for dt, name in tl:
+                for dt, role in tl:
                     if started is None:
-                        if any(k in name for k in _ACCEPT_KEYS):
+                        if role == "accept":
                             started = dt
                             last_dt = dt
                         continue
                     secs += (to_dt(dt) - to_dt(last_dt)).total_seconds()
                     last_dt = dt
-                    if any(k in name for k in _DONE_KEYS):
+                    if role in WORK_DONE_ROLES:
                         break
             rec._work_duration_secs = max(0.0, secs)
 
@@ -113,17 +90,10 @@ class CrmLead(models.Model):
         for rec in self:
             rec.work_duration_badge = self._fmt_badge_from_seconds(rec._work_duration_secs)
 
-    # Stamp times on stage change to keep future computes fast
-    def write(self, vals):
-        stage_changed = "stage_id" in vals
-        res = super().write(vals)
-        if stage_changed:
-            now = fields.Datetime.now()
-            for rec in self.sudo():
-                rec.stage_entered_dt = now
-                nm = (rec.stage_id.name or "").lower()
-                if any(k in nm for k in _ACCEPT_KEYS) and not rec.accepted_dt:
-                    rec.accepted_dt = now
-                if getattr(rec.stage_id, "is_won", False) or any(k in nm for k in _DONE_KEYS):
-                    rec.completed_dt = now
-        return res
+    @api.model_create_multi
+    def create(self, vals_list):
+        leads = super().create(vals_list)
+        self.env["crm.lead.stage.event"]._log_transitions(
+            [(lead.id, False, lead.stage_id.id) for lead in leads if lead.stage_id]
+        )
+        return leads
@@ -1,5 +1,9 @@
 # crm_office_ui/models/crm_lead_photo.py
-from odoo import models, fields
+import base64
+
+from odoo import api, models, fields
+
+from .photo_ingest import PHOTO_MAX_SIDE, shrink_photo
 
 class CrmLeadPhoto(models.Model):
     _name = "crm.lead.photo"
@@ -8,6 +12,22 @@ class CrmLeadPhoto(models.Model):
 
     lead_id = fields.Many2one("crm.lead", required=True, ondelete="cascade", index=True)
     name = fields.Char("Sarlavha")
-    image_1920 = fields.Image("Rasm", required=True)
+    image_1920 = fields.Image("Rasm", required=True, max_width=PHOTO_MAX_SIDE, max_height=PHOTO_MAX_SIDE)
     note = fields.Char("Izoh")
     sequence = fields.Integer(default=10)
+
+    @api.model
+    def _shrink_image_vals(self, vals):
+        if vals.get("image_1920"):
+            raw = base64.b64decode(vals["image_1920"])
+            out = shrink_photo(raw)
+            if out is not raw:
+                vals["image_1920"] = base64.b64encode(out)
+        return vals
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        return super().create([self._shrink_image_vals(vals) for vals in vals_list])
+
+    def write(self, vals):
+        return super().write(self._shrink_image_vals(vals))
@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+import logging
+import time
+import uuid
+from datetime import timedelta
+from urllib.parse import urlencode, urlsplit, urlunsplit
+
+import requests
+
+from odoo import _, api, fields, models
+from odoo.tools import consteq
+
+from .crm_lead_telegram_outbox import _http_session
+
+_logger = logging.getLogger(__name__)
+
+SMS_BATCH_SIZE = 200
+SMS_TIMEOUT = 20
+SMS_MAX_ATTEMPTS = 6
+SMS_OK_STATUSES = ("success", "ok", "accepted", "waiting")
+
+NOTIFY_ESKIZ_BASE = "https://notify.eskiz.uz/api"
+TOKEN_PARAM = "crm_rating_sms.notify_eskiz_token"
+TOKEN_EXP_PARAM = "crm_rating_sms.notify_eskiz_token_exp"
+TOKEN_TTL = 29 * 24 * 3600  # Eskiz tokens live 30 days
+
+CALLBACK_ROUTE = "/crm_office_ui/sms/eskiz_callback"
+CALLBACK_URL_PARAM = "crm_rating_sms.callback_url"  # optional override of the callback URL
+CALLBACK_SECRET_PARAM = "crm_office_ui.sms_callback_secret"
+
+
+class CrmLeadSmsQueue(models.Model):
+    _name = "crm.lead.sms.queue"
+    _description = "Warranty SMS navbati"
+    _order = "id"
+
+    lead_id = fields.Many2one("crm.lead", required=True, ondelete="cascade", index=True)
+    phone = fields.Char(required=True)
+    text = fields.Text(required=True)
+    state = fields.Selection(
+        [("pending", "Navbatda"), ("sent", "Yuborildi"), ("failed", "Xato")],
+        default="pending", required=True, index=True,
+    )
+    provider = fields.Selection(
+        [("note", "Note-only"), ("my_eskiz", "my.eskiz.uz"), ("notify_eskiz", "notify.eskiz.uz")],
+    )
+    user_sms_id = fields.Char(
+        required=True, copy=False, index=True,
+        default=lambda self: uuid.uuid4().hex,
+    )
+    provider_message_id = fields.Char()
+    provider_status = fields.Char(help="Eskiz callback orqali kelgan oxirgi holat (DELIVRD, REJECTD, ...).")
+    status_at = fields.Datetime()
+    attempts = fields.Integer(default=0)
+    next_attempt_at = fields.Datetime(default=fields.Datetime.now, index=True)
+    sent_at = fields.Datetime()
+    last_error = fields.Char()
+
+    _sql_constraints = [
+        ("uniq_user_sms_id", "unique(user_sms_id)", "user_sms_id must be unique."),
+    ]
+
+    # -----------------------------
+    # Queue
+    # -----------------------------
+    @api.model
+    def _enqueue(self, items):
+        """items: [(lead, phone, text), ...]; skips leads already queued or sent."""
+        if not items:
+            return self.browse()
+        existing = self.sudo().search([
+            ("lead_id", "in", [it[0].id for it in items]),
+            ("state", "in", ("pending", "sent")),
+        ])
+        seen = set(existing.mapped("lead_id").ids)
+        vals_list = []
+        for lead, phone, text in items:
+            if lead.id in seen:
+                continue
+            seen.add(lead.id)
+            vals_list.append({"lead_id": lead.id, "phone": phone, "text": text})
+        return self.sudo().create(vals_list)
+
+    @api.model
+    def _sms_config(self):
+        ICP = self.env["ir.config_parameter"].sudo()
+        return {
+            "use_odoo_sms": (ICP.get_param("crm_rating_sms.use_odoo_sms") or "0") == "1",
+            "use_my_eskiz": (ICP.get_param("crm_rating_sms.use_my_eskiz") or "0").lower() in ("1", "true", "yes"),
+            "my_eskiz_base": (ICP.get_param("crm_rating_sms.my_eskiz_base") or "https://my.eskiz.uz/api").rstrip("/"),
+            "my_eskiz_token": (ICP.get_param("crm_rating_sms.my_eskiz_token") or "").strip(),
+            "my_eskiz_from": (ICP.get_param("crm_rating_sms.my_eskiz_from")
+                              or ICP.get_param("crm_rating_sms.sender") or "4546").strip(),
+            "sender": ICP.get_param("crm_rating_sms.sender", "4546"),
+            "callback_url": self._callback_url(),
+        }
+
+    @api.model
+    def _callback_secret(self):
+        """Shared secret Eskiz echoes back in the callback URL; generated on first use."""
+        ICP = self.env["ir.config_parameter"].sudo()
+        secret = ICP.get_param(CALLBACK_SECRET_PARAM)
+        if not secret:
+            secret = uuid.uuid4().hex
+            ICP.set_param(CALLBACK_SECRET_PARAM, secret)
+        return secret
+
+    @api.model
+    def _callback_url(self):
+        """crm_rating_sms.callback_url if configured, else our route on web.base.url; signed with the secret."""
+        ICP = self.env["ir.config_parameter"].sudo()
+        url = (ICP.get_param(CALLBACK_URL_PARAM) or "").strip()
+        if not url:
+            base_url = (ICP.get_param("web.base.url") or "").rstrip("/")
+            if not base_url:
+                return None
+            url = f"{base_url}{CALLBACK_ROUTE}"
+        parts = urlsplit(url)
+        query = "&".join(filter(None, [parts.query, urlencode({"token": self._callback_secret()})]))
+        return urlunsplit(parts._replace(query=query))
+
+    @api.model
+    def _check_callback_token(self, token):
+        secret = self.env["ir.config_parameter"].sudo().get_param(CALLBACK_SECRET_PARAM)
+        return bool(secret and token and consteq(str(token), secret))
+
+    @api.model
+    def _cron_send_queue(self, batch_size=SMS_BATCH_SIZE):
+        return self._process_queue(batch_size=batch_size, auto_commit=True)
+
+    def _process_queue(self, batch_size=SMS_BATCH_SIZE, auto_commit=False):
+        msgs = self.sudo().search([
+            ("state", "=", "pending"),
+            ("next_attempt_at", "<=", fields.Datetime.now()),
+        ], limit=batch_size)
+        if not msgs:
+            return 0
+        cfg = self._sms_config()
+
+        if cfg["use_odoo_sms"]:
+            for msg in msgs:
+                msg.lead_id.message_post(body=_("Warranty SMS (note-only): %s -> %s") % (msg.phone, msg.text))
+            msgs._mark_sent("note")
+            return len(msgs)
+
+        if cfg["use_my_eskiz"]:
+            if not (cfg["my_eskiz_token"] and cfg["my_eskiz_from"]):
+                msgs._mark_failed("my.eskiz: token yoki sender sozlanmagan.")
+                return 0
+            url = f"{cfg['my_eskiz_base']}/message/sms/send-batch"
+            ok = msgs._send("my_eskiz", url, cfg["my_eskiz_token"], cfg["my_eskiz_from"], cfg["callback_url"])
+        else:
+            token = self._notify_eskiz_token()
+            if not token:
+                msgs._mark_failed("notify.eskiz: token olinmadi.")
+                return 0
+            url = f"{NOTIFY_ESKIZ_BASE}/message/sms/send-batch"
+            ok = msgs._send("notify_eskiz", url, token, cfg["sender"], cfg["callback_url"])
+            if ok is None:
+                # token rejected: refresh once and retry the same batch
+                token = self._notify_eskiz_token(force=True)
+                ok = msgs._send("notify_eskiz", url, token, cfg["sender"], cfg["callback_url"]) if token else None
+
+        if ok is None:
+            msgs._mark_failed("Eskiz: token rad etildi (401).")
+        if auto_commit:
+            self.env.cr.commit()
+        return len(msgs) if ok else 0
+
+    def _send(self, provider, url, token, sender, callback_url):
+        """send-batch for the whole set; when Eskiz rejects the batch, retry message by message
+        so one bad number does not fail the other ones.
+
+        Returns True if anything was sent, False otherwise, None when the token was rejected.
+        """
+        res = self._send_batch(provider, url, token, sender, callback_url)
+        if res is True or res is None or res is False:
+            return res
+        if len(self) == 1:
+            self._mark_failed(res)
+            return False
+        _logger.info("%s: batch of %s rejected (%s), sending one by one", provider, len(self), res[:200])
+        sent = False
+        for msg in self:
+            r = msg._send_batch(provider, url, token, sender, callback_url)
+            if r is None:
+                r = f"{provider}: token rad etildi (401)."
+            if r is True:
+                sent = True
+            elif r is not False:
+                msg._mark_failed(r)
+        return sent
+
+    def _send_batch(self, provider, url, token, sender, callback_url):
+        """POST all messages in one send-batch call.
+
+        Returns True on success, None when the token was rejected, False on a network error
+        (messages already rescheduled), else the provider's error text (nothing marked).
+        """
+        payload = {
+            "messages": [{"user_sms_id": m.user_sms_id, "to": m.phone, "text": m.text} for m in self],
+            "from": sender,
+            "dispatch_id": self[:1].id,
+        }
+        if callback_url:
+            payload["callback_url"] = callback_url
+        headers = {"Authorization": f"Bearer {token}"}
+        try:
+            r = _http_session().post(url, json=payload, headers=headers, timeout=SMS_TIMEOUT)
+        except requests.RequestException as e:
+            self._mark_failed(f"{provider}: {e}")
+            return False
+        if r.status_code == 401:
+            return None
+        try:
+            js = r.json()
+        except ValueError:
+            js = {"status": f"http {r.status_code}", "body": r.text}
+        status = str(js.get("status") or "").lower()
+        if r.status_code == 200 and (status in SMS_OK_STATUSES or js.get("id")):
+            self.write({"provider_message_id": str(js.get("id") or "")})
+            self._mark_sent(provider)
+            return True
+        return f"{provider}: {str(js)[:400]}"
+
+    @api.model
+    def _notify_eskiz_token(self, force=False):
+        """Bearer token shared by all workers through ir.config_parameter until it expires."""
+        ICP = self.env["ir.config_parameter"].sudo()
+        if not force:
+            token = ICP.get_param(TOKEN_PARAM)
+            exp = int(ICP.get_param(TOKEN_EXP_PARAM) or 0)
+            if token and exp > time.time():
+                return token
+        try:
+            eskiz = self.env["crm.lead"]._eskiz_client()
+            if force:
+                eskiz.token.set("")
+            token = eskiz.token.get()
+        except Exception as e:
+            _logger.warning("notify.eskiz login failed: %s", e)
+            return False
+        if token:
+            ICP.set_param(TOKEN_PARAM, token)
+            ICP.set_param(TOKEN_EXP_PARAM, str(int(time.time()) + TOKEN_TTL))
+        return token
+
+    def _mark_sent(self, provider):
+        self.write({
+            "state": "sent",
+            "provider": provider,
+            "sent_at": fields.Datetime.now(),
+            "last_error": False,
+        })
+        leads = self.mapped("lead_id")
+        leads.sudo().write({"warranty_sms_sent": True})
+        if provider != "note":
+            for lead in leads:
+                lead.message_post(body=_("Warranty SMS yuborildi (%s): %s") % (
+                    dict(self._fields["provider"].selection)[provider],
+                    ", ".join(self.filtered(lambda m: m.lead_id == lead).mapped("phone")),
+                ))
+
+    def _mark_failed(self, error):
+        now = fields.Datetime.now()
+        for msg in self:
+            attempts = msg.attempts + 1
+            vals = {"attempts": attempts, "last_error": (error or "")[:500]}
+            if attempts >= SMS_MAX_ATTEMPTS:
+                vals["state"] = "failed"
+                msg.lead_id.message_post(body=_("Warranty SMS yuborilmadi: %s") % (vals["last_error"],))
+            else:
+                vals["next_attempt_at"] = now + timedelta(seconds=min(60 * (2 ** (attempts - 1)), 6 * 3600))
+            msg.write(vals)
+
+    @api.model
+    def _record_callback(self, data):
+        """Store an Eskiz delivery report (user_sms_id / status / message_id)."""
+        sms_id = (data.get("user_sms_id") or "").strip()
+        if not sms_id:
+            return False
+        msg = self.sudo().search([("user_sms_id", "=", sms_id)], limit=1)
+        if not msg:
+            return False
+        msg.write({
+            "provider_status": str(data.get("status") or "")[:64],
+            "provider_message_id": str(data.get("message_id") or msg.provider_message_id or ""),
+            "status_at": fields.Datetime.now(),
+        })
+        return True
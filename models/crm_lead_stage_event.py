@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+import logging
+import time
+
+from odoo import api, fields, models
+
+_logger = logging.getLogger(__name__)
+
+PARAM_EVENTS_SINCE = "crm_office_ui.stage_event_since"
+PARAM_BACKFILL_CURSOR = "crm_office_ui.stage_event_backfill_cursor"
+
+
+class CrmLeadStageEvent(models.Model):
+    """One row per stage transition; live rows come from crm.lead.write(),
+    rows older than PARAM_EVENTS_SINCE are imported from mail.tracking.value."""
+    _name = "crm.lead.stage.event"
+    _description = "Murojaat bosqich o'zgarishi"
+    _order = "lead_id, date, id"
+    _log_access = False
+
+    lead_id = fields.Many2one("crm.lead", required=True, ondelete="cascade", index=True)
+    from_stage_id = fields.Many2one("crm.stage", ondelete="set null")
+    to_stage_id = fields.Many2one("crm.stage", ondelete="set null", index=True)
+    date = fields.Datetime(required=True, index=True)
+    user_id = fields.Many2one("res.users", ondelete="set null")
+
+    def init(self):
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS crm_lead_stage_event_lead_date_index
+                ON crm_lead_stage_event (lead_id, date)
+        """)
+        ICP = self.env["ir.config_parameter"].sudo()
+        if not ICP.get_param(PARAM_EVENTS_SINCE):
+            ICP.set_param(PARAM_EVENTS_SINCE, fields.Datetime.to_string(fields.Datetime.now()))
+
+    @api.model
+    def _log_transitions(self, transitions):
+        """transitions: [(lead_id, from_stage_id, to_stage_id), ...] stamped now / current user."""
+        now = fields.Datetime.now()
+        return self.sudo().create([{
+            "lead_id": lead_id,
+            "from_stage_id": from_id or False,
+            "to_stage_id": to_id or False,
+            "date": now,
+            "user_id": self.env.uid,
+        } for lead_id, from_id, to_id in transitions if from_id != to_id])
+
+    @api.model
+    def _timelines(self, leads):
+        """{lead_id: [(dt, to_stage_role), ...]} oldest→newest, plus a 'now/current' closure.
+
+        Leads older than PARAM_EVENTS_SINCE that the tracking backfill has not reached yet
+        get their earlier history straight from mail.tracking.value, in one more query.
+        """
+        ids = [i for i in leads.ids if i]
+        timelines = {lid: [] for lid in ids}
+        roles = self.env["crm.stage"]._stage_role_map()
+        if ids:
+            self.flush_model()
+            self.env.cr.execute("""
+                SELECT lead_id, date, to_stage_id
+                  FROM crm_lead_stage_event
+                 WHERE lead_id = ANY(%s) AND to_stage_id IS NOT NULL
+                 ORDER BY lead_id, date, id
+            """, (ids,))
+            for lead_id, dt, stage_id in self.env.cr.fetchall():
+                timelines[lead_id].append((dt, roles.get(stage_id)))
+
+            ICP = self.env["ir.config_parameter"].sudo()
+            since = fields.Datetime.to_datetime(ICP.get_param(PARAM_EVENTS_SINCE))
+            cursor = int(ICP.get_param(PARAM_BACKFILL_CURSOR) or 0)
+            pending = [
+                lead.id for lead in leads
+                if lead.id and lead.id > cursor and since and lead.create_date and lead.create_date < since
+            ]
+            if pending:
+                for lead_id, dt, _from_id, to_id, _uid in self._tracking_rows(pending, since):
+                    if to_id:
+                        timelines[lead_id].append((dt, roles.get(to_id)))
+                for lead_id in pending:
+                    timelines[lead_id].sort(key=lambda r: r[0])
+        now = fields.Datetime.now()
+        for lead in leads:
+            if lead.id and lead.stage_id:
+                timelines[lead.id].append((now, roles.get(lead.stage_id.id)))
+        return timelines
+
+    # -----------------------------
+    # Backfill from chatter tracking
+    # -----------------------------
+    @api.model
+    def _cron_backfill_from_tracking(self, chunk_size=1000, time_budget=240):
+        """Import stage history older than PARAM_EVENTS_SINCE, lead chunk by lead chunk.
+
+        Progress is stored in PARAM_BACKFILL_CURSOR (last processed lead id) and committed
+        after every chunk, so the job can be stopped and resumed at any time.
+        """
+        ICP = self.env["ir.config_parameter"].sudo()
+        since = ICP.get_param(PARAM_EVENTS_SINCE)
+        if not since:
+            return 0
+        cursor = int(ICP.get_param(PARAM_BACKFILL_CURSOR) or 0)
+        deadline = time.monotonic() + time_budget
+        stage_ids = set(self.env["crm.stage"].sudo().search([]).ids)
+        user_ids = set(self.env["res.users"].sudo().with_context(active_test=False).search([]).ids)
+        total = 0
+        while time.monotonic() < deadline:
+            self.env.cr.execute("""
+                SELECT id FROM crm_lead WHERE id > %s AND create_date < %s ORDER BY id LIMIT %s
+            """, (cursor, since, chunk_size))
+            lead_ids = [r[0] for r in self.env.cr.fetchall()]
+            if not lead_ids:
+                break
+            total += self._import_tracking(lead_ids, since, stage_ids, user_ids)
+            cursor = lead_ids[-1]
+            ICP.set_param(PARAM_BACKFILL_CURSOR, str(cursor))
+            self.env.cr.commit()
+            _logger.info("crm.lead.stage.event backfill: %s events imported, lead cursor %s", total, cursor)
+        return total
+
+    @api.model
+    def _tracking_rows(self, lead_ids, before):
+        """[(lead_id, date, from_stage_id, to_stage_id, uid), ...] of stage_id tracking before ``before``."""
+        TV = self.env["mail.tracking.value"]
+        field_col = "field_id" if "field_id" in TV._fields else "field"
+        self.env.cr.execute(f"""
+            SELECT m.res_id, m.date, NULLIF(tv.old_value_integer, 0), NULLIF(tv.new_value_integer, 0),
+                   m.create_uid
+              FROM mail_tracking_value tv
+              JOIN mail_message m ON m.id = tv.mail_message_id
+              JOIN ir_model_fields f ON f.id = tv.{field_col}
+             WHERE m.model = 'crm.lead' AND m.res_id = ANY(%s) AND m.date < %s
+               AND f.model = 'crm.lead' AND f.name = 'stage_id'
+             ORDER BY m.res_id, m.date, m.id, tv.id
+        """, (lead_ids, before))
+        return self.env.cr.fetchall()
+
+    def _import_tracking(self, lead_ids, since, stage_ids, user_ids):
+        rows = self._tracking_rows(lead_ids, since)
+
+        self.env.cr.execute("""
+            SELECT lead_id, date, to_stage_id FROM crm_lead_stage_event WHERE lead_id = ANY(%s)
+        """, (lead_ids,))
+        existing = set(self.env.cr.fetchall())
+
+        vals_list = []
+        for lead_id, dt, from_id, to_id, uid in rows:
+            to_id = to_id if to_id in stage_ids else None
+            if (lead_id, dt, to_id) in existing:
+                continue
+            existing.add((lead_id, dt, to_id))
+            vals_list.append({
+                "lead_id": lead_id,
+                "from_stage_id": from_id if from_id in stage_ids else False,
+                "to_stage_id": to_id or False,
+                "date": dt,
+                "user_id": uid if uid in user_ids else False,
+            })
+        self.sudo().create(vals_list)
+        return len(vals_list)
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+import logging
+import time
+from datetime import timedelta
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from odoo import api, fields, models
+
+from .crm_lead_won_notify import TG_PARAM_KEY
+
+_logger = logging.getLogger(__name__)
+
+# Telegram limits: ~30 msg/s per bot, ~1 msg/s per chat
+TG_GLOBAL_INTERVAL = 1.0 / 25
+TG_CHAT_INTERVAL = 1.1
+TG_TIMEOUT = 10
+TG_MAX_ATTEMPTS = 8
+TG_RUN_BUDGET = 45  # seconds one cron run may spend sending
+
+_SESSION = None
+
+
+def _http_session():
+    """Process-wide keep-alive session shared by the Telegram and SMS queues."""
+    global _SESSION
+    if _SESSION is None:
+        s = requests.Session()
+        s.mount("https://", HTTPAdapter(pool_connections=2, pool_maxsize=8, max_retries=0))
+        _SESSION = s
+    return _SESSION
+
+
+class CrmLeadTelegramOutbox(models.Model):
+    _name = "crm.lead.telegram.outbox"
+    _description = "Usta Telegram xabarlari navbati"
+    _order = "id"
+
+    lead_id = fields.Many2one("crm.lead", required=True, ondelete="cascade", index=True)
+    kind = fields.Selection([("new", "Yangi zayavka"), ("won", "Tasdiqlandi")], required=True)
+    chat_id = fields.Char(required=True)
+    text = fields.Text(required=True)
+    state = fields.Selection(
+        [("pending", "Navbatda"), ("sent", "Yuborildi"), ("failed", "Xato")],
+        default="pending", required=True, index=True,
+    )
+    attempts = fields.Integer(default=0)
+    next_attempt_at = fields.Datetime(default=fields.Datetime.now, index=True)
+    sent_at = fields.Datetime()
+    tg_message_id = fields.Char()
+    last_error = fields.Char()
+
+    @api.model
+    def _enqueue(self, items):
+        """items: [(lead, kind, chat_id, text), ...] — same transaction as the caller.
+
+        Skips leads that already have a pending message of the same kind.
+        """
+        if not items:
+            return self.browse()
+        pending = self.sudo().search([
+            ("lead_id", "in", [it[0].id for it in items]),
+            ("state", "=", "pending"),
+        ])
+        queued = {(m.lead_id.id, m.kind) for m in pending}
+        vals_list = []
+        for lead, kind, chat_id, text in items:
+            if (lead.id, kind) in queued:
+                continue
+            queued.add((lead.id, kind))
+            vals_list.append({"lead_id": lead.id, "kind": kind, "chat_id": str(chat_id), "text": text})
+        return self.sudo().create(vals_list)
+
+    @api.model
+    def _cron_send_outbox(self, batch_size=200):
+        return self._process_queue(batch_size=batch_size, auto_commit=True)
+
+    def _process_queue(self, batch_size=200, auto_commit=False):
+        token = self.env["ir.config_parameter"].sudo().get_param(TG_PARAM_KEY)
+        if not token:
+            return 0
+        msgs = self.sudo().search([
+            ("state", "=", "pending"),
+            ("next_attempt_at", "<=", fields.Datetime.now()),
+        ], limit=batch_size)
+        if not msgs:
+            return 0
+
+        session = _http_session()
+        url = f"https://api.telegram.org/bot{token}/sendMessage"
+        deadline = time.monotonic() + TG_RUN_BUDGET
+        next_global = 0.0
+        next_chat = {}
+        done = 0
+
+        for msg in msgs:
+            now = time.monotonic()
+            wait = max(next_global, next_chat.get(msg.chat_id, 0.0)) - now
+            if now + max(wait, 0.0) > deadline:
+                break
+            if wait > 0:
+                time.sleep(wait)
+            now = time.monotonic()
+            next_global = now + TG_GLOBAL_INTERVAL
+            next_chat[msg.chat_id] = now + TG_CHAT_INTERVAL
+
+            retry_after = None
+            try:
+                r = session.post(
+                    url,
+                    data={"chat_id": msg.chat_id, "text": msg.text, "parse_mode": "HTML"},
+                    timeout=TG_TIMEOUT,
+                )
+                try:
+                    js = r.json()
+                except ValueError:
+                    js = {"ok": False, "description": f"http {r.status_code}"}
+                if js.get("ok"):
+                    msg._mark_sent(js.get("result") or {})
+                    done += 1
+                else:
+                    retry_after = (js.get("parameters") or {}).get("retry_after")
+                    if retry_after:
+                        next_chat[msg.chat_id] = time.monotonic() + retry_after
+                    # 4xx other than 429 won't get better by retrying
+                    permanent = 400 <= r.status_code < 500 and r.status_code != 429
+                    msg._mark_failed(js.get("description") or r.text, retry_after, permanent)
+            except requests.RequestException as e:
+                msg._mark_failed(str(e), None, False)
+
+            if auto_commit:
+                self.env.cr.commit()
+        return done
+
+    def _mark_sent(self, result):
+        self.ensure_one()
+        self.write({
+            "state": "sent",
+            "sent_at": fields.Datetime.now(),
+            "attempts": self.attempts + 1,
+            "tg_message_id": str(result.get("message_id") or ""),
+            "last_error": False,
+        })
+        flag = "notify_new_sent" if self.kind == "new" else "notify_won_sent"
+        self.lead_id.with_context(
+            __skip_new_notify__=True, __skip_won_notify__=True
+        ).sudo().write({flag: True})
+
+    def _mark_failed(self, error, retry_after, permanent):
+        self.ensure_one()
+        attempts = self.attempts + 1
+        if permanent or attempts >= TG_MAX_ATTEMPTS:
+            _logger.warning("Telegram outbox #%s (lead %s) failed: %s", self.id, self.lead_id.id, error)
+            self.write({"state": "failed", "attempts": attempts, "last_error": (error or "")[:500]})
+            return
+        delay = retry_after or min(30 * (2 ** (attempts - 1)), 6 * 3600)
+        self.write({
+            "attempts": attempts,
+            "next_attempt_at": fields.Datetime.now() + timedelta(seconds=delay),
+            "last_error": (error or "")[:500],
+        })
@@ -1,5 +1,4 @@
 # -*- coding: utf-8 -*-
-import requests
 from odoo import models, fields, api, _
 from odoo.tools import format_datetime
 
@@ -18,7 +17,7 @@ def _fmt_addr(lead):
 class CrmLead(models.Model):
     _inherit = "crm.lead"
 
-    # Flags to avoid duplicate sends
+    # Flags to avoid duplicate sends (set by the outbox once Telegram confirms delivery)
     notify_won_sent = fields.Boolean(default=False, copy=False)
     notify_new_sent = fields.Boolean(default=False, copy=False)
 
@@ -30,7 +29,7 @@ class CrmLead(models.Model):
         return bool(getattr(r.stage_id, "is_won", False)) or (getattr(r, "probability", 0.0) >= 100.0)
 
     def _is_new_stage_now(self, r):
-        """Is the lead currently in 'Yangi so‘rovlar' stage (by ICP id or name heuristics)."""
+        """Is the lead currently in 'Yangi so‘rovlar' stage (by ICP id or stage role)."""
         st = r.stage_id
         if not st:
             return False
@@ -41,10 +40,7 @@ class CrmLead(models.Model):
             sid = 0
         if sid and st.id == sid:
             return True
-        nm = (st.name or "").lower()
-        # Heuristic fallbacks:
-        # "Yangi so'rovlar", "Yangi", "New", "Yangi so‘rov", etc.
-        return any(k in nm for k in ("yangi", "new", "so'rov", "so‘rov"))
+        return self.env["crm.stage"]._stage_role_map().get(st.id) == "new"
 
 
     # def _is_confirmed_by_usta(self,r):
@@ -65,18 +61,21 @@ class CrmLead(models.Model):
 
 
     # -----------------------------
-    # Telegram senders
+    # Telegram senders (queued into crm.lead.telegram.outbox, delivered by cron)
     # -----------------------------
+    def _usta_chat_id(self):
+        self.ensure_one()
+        usta = getattr(self, "usta_id", False)
+        return (usta and getattr(usta, "tg_chat_id", False)) or getattr(self, "tg_card_chat_id", False)
+
     def _send_usta_new_telegram(self):
         ICP = self.env["ir.config_parameter"].sudo()
         token = ICP.get_param(TG_PARAM_KEY)
         if not token:
             return
+        items = []
         for lead in self:
-            usta = getattr(lead, "usta_id", False)
-            chat_id = usta and getattr(usta, "tg_chat_id", False)
-            if not chat_id:
-                chat_id = getattr(lead, "tg_card_chat_id", False)
+            chat_id = lead._usta_chat_id()
             if not chat_id:
                 continue
 
@@ -95,15 +94,8 @@ class CrmLead(models.Model):
                 f"\n Zayavkani qabul qilish uchun Aktive zayavkalar bo'limini tanlang!"
             )
 
-            try:
-                requests.post(
-                    f"https://api.telegram.org/bot{token}/sendMessage",
-                    data={"chat_id": str(chat_id), "text": txt, "parse_mode": "HTML"},
-                    timeout=6,
-                )
-            except Exception:
-                # never block business writes
-                pass
+            items.append((lead, "new", chat_id, txt))
+        self.env["crm.lead.telegram.outbox"]._enqueue(items)
 
     def _send_usta_won_telegram(self):
         ICP = self.env["ir.config_parameter"].sudo()
@@ -111,11 +103,9 @@ class CrmLead(models.Model):
         if not token:
             return
 
+        items = []
         for lead in self:
-            usta = getattr(lead, "usta_id", False)
-            chat_id = usta and getattr(usta, "tg_chat_id", False)
-            if not chat_id:
-                chat_id = getattr(lead, "tg_card_chat_id", False)
+            chat_id = lead._usta_chat_id()
             if not chat_id:
                 continue
 
@@ -147,58 +137,17 @@ class CrmLead(models.Model):
                 f"{warning_txt}"
             )
 
-            try:
-                requests.post(
-                    f"https://api.telegram.org/bot{token}/sendMessage",
-                    data={"chat_id": str(chat_id), "text": txt, "parse_mode": "HTML"},
-                    timeout=6,
-                )
-            except Exception:
-                pass
+            items.append((lead, "won", chat_id, txt))
+        self.env["crm.lead.telegram.outbox"]._enqueue(items)
 
     # -----------------------------
-    # create/write hooks
+    # create hook (stage transitions are notified by the write() engine in crm_lead.py)
     # -----------------------------
     @api.model_create_multi
     def create(self, vals_list):
         leads = super().create(vals_list)
-        # After create: send "new" only if in new stage and not sent yet
+        # After create: queue "new" only if in new stage and not sent yet
         to_notify = leads.filtered(lambda r: not r.notify_new_sent and self._is_new_stage_now(r))
         if to_notify:
             to_notify._send_usta_new_telegram()
-            to_notify.with_context(__skip_new_notify__=True).sudo().write({"notify_new_sent": True})
         return leads
-
-    def write(self, vals):
-        # prevent recursion from our own flags
-        ctx = self.env.context
-        skip_new = ctx.get("__skip_new_notify__")
-        skip_won = ctx.get("__skip_won_notify__")
-
-        # Snapshots before write
-        new_before = {r.id: self._is_new_stage_now(r) for r in self}
-        won_before = {r.id: self._is_won_now(r) for r in self}
-
-        res = super().write(vals)
-
-        # Recompute after write
-        records = self.sudo()
-        # NEW stage transitions
-        if not skip_new:
-            newly_new = records.filtered(
-                lambda r: not r.notify_new_sent and self._is_new_stage_now(r) and not new_before.get(r.id, False)
-            )
-            if newly_new:
-                newly_new._send_usta_new_telegram()
-                newly_new.with_context(__skip_new_notify__=True).sudo().write({"notify_new_sent": True})
-
-        # WON transitions
-        if not skip_won:
-            newly_won = records.filtered(
-                lambda r: not r.notify_won_sent and self._is_won_now(r) and not won_before.get(r.id, False)
-            )
-            if newly_won:
-                newly_won._send_usta_won_telegram()
-                newly_won.with_context(__skip_won_notify__=True).sudo().write({"notify_won_sent": True})
-
-        return res
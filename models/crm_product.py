@@ -5,10 +5,25 @@ import requests
 from eskiz_sms import EskizSMS
 from eskiz_sms.exceptions import BadRequest, InvalidCredentials
 
+import itertools
 import logging
+import time
+
+import psycopg2
 
 _logger = logging.getLogger(__name__)
 
+SALE_SNAPSHOT_FIELDS = (
+    "sale_date", "warehouse_name", "salesperson_name", "serial_name", "lot_name",
+    "sold_qty", "sold_price_unit", "sold_partner", "sold_phone",
+)
+SALE_SNAPSHOT_TYPES = {  # SQL casts for the cron's VALUES list (varchar otherwise)
+    "sale_date": "timestamp", "sale_snapshot_at": "timestamp",
+    "sold_qty": "float8", "sold_price_unit": "float8",
+}
+# "0" turns the refresh cron off: lines keep the sync values computed when they were linked
+PARAM_SALE_SNAPSHOT = "crm_office_ui.sale_snapshot"
+
 
 class CrmLeadProductLine(models.Model):
     _name = "crm.lead.product.line"
@@ -42,33 +57,116 @@ class CrmLeadProductLine(models.Model):
         required=True,
         index=True,
     )
-    # --- SALE INFO (from product.sale.sync) ---
-    sale_date = fields.Datetime(string="Sotuv sanasi", related="sync_line_id.sale_date", store=False, readonly=True)
-    warehouse_name = fields.Char(string="Dukon", related="sync_line_id.warehouse_name", store=False, readonly=True)
-    salesperson_name = fields.Char(string="Sotuvchi", related="sync_line_id.salesperson_name", store=False, readonly=True)
+    # --- SALE INFO: snapshot of product.sale.sync, computed when sync_line_id is set ---
+    # Stored locally so product lists and serial/shop searches never join the sync table;
+    # _cron_refresh_sale_snapshot() re-copies rows whose sync row or buyer changed.
+    # Optional: PARAM_SALE_SNAPSHOT = "0" stops the refresh (lines keep the values taken when linked).
+    sale_date = fields.Datetime(string="Sotuv sanasi", compute="_compute_sale_snapshot", store=True, readonly=True, precompute=True)
+    warehouse_name = fields.Char(string="Dukon", compute="_compute_sale_snapshot", store=True, readonly=True, precompute=True, index=True)
+    salesperson_name = fields.Char(string="Sotuvchi", compute="_compute_sale_snapshot", store=True, readonly=True, precompute=True)
 
-    serial_name = fields.Char(string="Serial", related="sync_line_id.serial_name", store=False, readonly=True)
-    # If sync_line_id has lot_id, you can show it too:
-    lot_name = fields.Char(string="Lot", compute="_compute_lot_name", store=False, readonly=True)
+    serial_name = fields.Char(string="Serial", compute="_compute_sale_snapshot", store=True, readonly=True, precompute=True, index=True)
+    lot_name = fields.Char(string="Lot", compute="_compute_sale_snapshot", store=True, readonly=True, precompute=True)
 
-    sold_qty = fields.Float(string="Sotilgan miqdor", related="sync_line_id.quantity", store=False, readonly=True)
-    sold_price_unit = fields.Float(string="Sotuv narxi", related="sync_line_id.price_unit", store=False, readonly=True)
+    sold_qty = fields.Float(string="Sotilgan miqdor", compute="_compute_sale_snapshot", store=True, readonly=True, precompute=True)
+    sold_price_unit = fields.Float(string="Sotuv narxi", compute="_compute_sale_snapshot", store=True, readonly=True, precompute=True)
 
-    sold_partner = fields.Char(string="Sotib olgan", compute="_compute_sold_partner", store=False, readonly=True)
-    sold_phone = fields.Char(string="Telefon", compute="_compute_sold_partner", store=False, readonly=True)
+    sold_partner = fields.Char(string="Sotib olgan", compute="_compute_sale_snapshot", store=True, readonly=True, precompute=True)
+    sold_phone = fields.Char(string="Telefon", compute="_compute_sale_snapshot", store=True, readonly=True, precompute=True)
+    sale_snapshot_at = fields.Datetime(compute="_compute_sale_snapshot", store=True, readonly=True, precompute=True, copy=False)
+
+    @api.model
+    def _sale_snapshot_vals(self, sync):
+        p = sync.partner_id
+        return {
+            "sale_date": sync.sale_date,
+            "warehouse_name": sync.warehouse_name,
+            "salesperson_name": sync.salesperson_name,
+            "serial_name": sync.serial_name,
+            "lot_name": sync.lot_id.name if sync.lot_id else False,
+            "sold_qty": sync.quantity,
+            "sold_price_unit": sync.price_unit,
+            "sold_partner": p.name if p else False,
+            "sold_phone": (p.phone or p.mobile) if p else False,
+        }
+
+    @api.model
+    def _sale_snapshot_enabled(self):
+        return self.env["ir.config_parameter"].sudo().get_param(PARAM_SALE_SNAPSHOT, "1") != "0"
 
-    @api.depends("sync_line_id.lot_id", "sync_line_id.lot_id.name")
-    def _compute_lot_name(self):
-        for rec in self:
-            rec.lot_name = rec.sync_line_id.lot_id.name if rec.sync_line_id and rec.sync_line_id.lot_id else False
+    @api.model
+    def _sale_snapshots(self, sync_ids):
+        """{sync_id: snapshot vals incl. sale_snapshot_at}, read for all ids at once."""
+        now = fields.Datetime.now()
+        syncs = self.env["product.sale.sync"].sudo().browse(set(sync_ids) - {False})
+        # prefetch lots and partners of the whole batch
+        syncs.mapped("lot_id.name")
+        syncs.mapped("partner_id.phone")
+        return {sync.id: dict(self._sale_snapshot_vals(sync), sale_snapshot_at=now) for sync in syncs}
+
+    @api.depends("sync_line_id")
+    def _compute_sale_snapshot(self):
+        # one batch read for the whole recordset, also for unsaved lines in the form
+        snapshots = self._sale_snapshots(self.sync_line_id._origin.ids)
+        empty = dict.fromkeys(SALE_SNAPSHOT_FIELDS + ("sale_snapshot_at",), False)
+        for line in self:
+            line.update(snapshots.get(line.sync_line_id._origin.id, empty))
 
-    @api.depends("sync_line_id.partner_id", "sync_line_id.partner_id.phone", "sync_line_id.partner_id.mobile")
-    def _compute_sold_partner(self):
-        for rec in self:
-            p = rec.sync_line_id.partner_id if rec.sync_line_id else False
-            rec.sold_partner = p.name if p else False
-            rec.sold_phone = (p.phone or p.mobile) if p else False
+    @api.model
+    def _cron_refresh_sale_snapshot(self, chunk_size=2000, time_budget=240):
+        if not self._sale_snapshot_enabled():
+            return 0
+        return self._refresh_sale_snapshot(chunk_size=chunk_size, time_budget=time_budget)
 
+    @api.model
+    def _refresh_sale_snapshot(self, chunk_size=2000, time_budget=None):
+        """Re-copy lines whose product.sale.sync row, buyer or lot changed after their
+        snapshot (or that never had one). ``time_budget=None`` runs until done.
+
+        One UPDATE ... FROM (VALUES ...) per chunk, committed; the ORM write stack is not involved.
+        """
+        SaleSync = self.env["product.sale.sync"]
+        cr = self.env.cr
+        deadline = time.monotonic() + time_budget if time_budget is not None else None
+        total = 0
+        while deadline is None or time.monotonic() < deadline:
+            cr.execute(f"""
+                SELECT l.id, l.sync_line_id
+                  FROM crm_lead_product_line l
+                  JOIN {SaleSync._table} s ON s.id = l.sync_line_id
+                  LEFT JOIN res_partner p ON p.id = s.partner_id
+                  LEFT JOIN stock_lot lot ON lot.id = s.lot_id
+                 WHERE l.sale_snapshot_at IS NULL
+                    OR s.write_date > l.sale_snapshot_at
+                    OR p.write_date > l.sale_snapshot_at
+                    OR lot.write_date > l.sale_snapshot_at
+                 ORDER BY l.id
+                 LIMIT %s
+            """, (chunk_size,))
+            rows = cr.fetchall()
+            if not rows:
+                break
+            snapshots = self._sale_snapshots([sync_id for _id, sync_id in rows])
+            columns = SALE_SNAPSHOT_FIELDS + ("sale_snapshot_at",)
+            row_sql = "(%s, " + ", ".join(
+                f"%s::{SALE_SNAPSHOT_TYPES.get(f, 'varchar')}" for f in columns
+            ) + ")"
+            params = []
+            for line_id, sync_id in rows:
+                snap = snapshots[sync_id]
+                params.append(line_id)
+                params.extend(snap[f] or None for f in columns)
+            cr.execute(f"""
+                UPDATE crm_lead_product_line l
+                   SET {", ".join(f"{f} = v.{f}" for f in columns)}
+                  FROM (VALUES {", ".join([row_sql] * len(rows))}) AS v(id, {", ".join(columns)})
+                 WHERE l.id = v.id
+            """, params)
+            self.invalidate_model(list(columns))
+            total += len(rows)
+            cr.commit()
+            _logger.info("crm.lead.product.line sale snapshot: %s lines refreshed", total)
+        return total
 
     @api.depends("quantity", "price_unit")
     def _compute_subtotal(self):
@@ -99,6 +197,13 @@ from odoo import api, fields, models, _
 from odoo.exceptions import UserError
 
 
+def _tg_key(vals):
+    """(chat, message) identifying a Telegram event, or None when the bot sent no ids."""
+    if vals["tg_chat_id"] and vals["tg_message_id"]:
+        return vals["tg_chat_id"], vals["tg_message_id"]
+    return None
+
+
 class CrmProductWork(models.Model):
     _name = "crmproduct_work"
     _description = "CRM Product Work (Take/Return)"
@@ -122,6 +227,63 @@ class CrmProductWork(models.Model):
     tg_chat_id = fields.Char()
     tg_message_id = fields.Char()
 
+    def init(self):
+        cr = self.env.cr
+        # duplicates of older installs are removed by migrations/1.3/pre-migrate.py
+        cr.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS crmproduct_work_tg_message_uniq
+                ON crmproduct_work (tg_chat_id, tg_message_id)
+             WHERE tg_chat_id <> '' AND tg_message_id <> ''
+        """)
+        cr.execute("""
+            CREATE INDEX IF NOT EXISTS crmproduct_work_lead_usta_latest_index
+                ON crmproduct_work (lead_id, usta_id, create_date DESC, id DESC)
+        """)
+        # fill the lead pointer for rows written before it existed
+        cr.execute("""
+            UPDATE crm_lead l
+               SET prodwork_last_state = w.state, prodwork_last_usta_id = w.usta_id
+              FROM (
+                    SELECT DISTINCT ON (lead_id) lead_id, usta_id, state
+                      FROM crmproduct_work
+                     ORDER BY lead_id, create_date DESC, id DESC
+              ) w
+             WHERE l.id = w.lead_id AND l.prodwork_last_state IS NULL
+        """)
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        self._refresh_lead_pointers(records.mapped("lead_id").ids)
+        return records
+
+    def unlink(self):
+        lead_ids = self.mapped("lead_id").ids
+        res = super().unlink()
+        self._refresh_lead_pointers(lead_ids)
+        return res
+
+    @api.model
+    def _refresh_lead_pointers(self, lead_ids):
+        """Point each lead at its newest work row (NULL when none is left)."""
+        if not lead_ids:
+            return
+        self.flush_model()
+        self.env.cr.execute("""
+            UPDATE crm_lead l
+               SET prodwork_last_state = w.state, prodwork_last_usta_id = w.usta_id
+              FROM unnest(%s::int[]) AS ids(lead_id)
+              LEFT JOIN LATERAL (
+                    SELECT state, usta_id FROM crmproduct_work
+                     WHERE lead_id = ids.lead_id
+                     ORDER BY create_date DESC, id DESC
+                     LIMIT 1
+              ) w ON TRUE
+             WHERE l.id = ids.lead_id
+        """, (list(lead_ids),))
+        self.env["crm.lead"].browse(lead_ids).invalidate_recordset(
+            ["prodwork_last_state", "prodwork_last_usta_id", "prodwork_state"]
+        )
 
     @api.model
     def latest_state(self, lead_id, usta_id):
@@ -134,45 +296,123 @@ class CrmProductWork(models.Model):
 
     @api.model
     def create_take(self, lead_id, usta_id, tg_user_id=None, tg_chat_id=None, tg_message_id=None, note=None):
-        lead = self.env["crm.lead"].sudo().browse(int(lead_id))
-        if not lead.exists():
-            raise UserError(_("Zayavka topilmadi."))
-
-        vals = {
-            "lead_id": int(lead_id),
-            "usta_id": int(usta_id),
-            "state": "take",
-            "note": note or "",
-            "tg_user_id": str(tg_user_id or ""),
-            "tg_chat_id": str(tg_chat_id or ""),
-            "tg_message_id": str(tg_message_id or ""),
-        }
-        rec = self.sudo().create(vals)
-
-        return rec
+        return self._create_one("take", lead_id, usta_id, tg_user_id, tg_chat_id, tg_message_id, note)
 
     @api.model
     def create_return(self, lead_id, usta_id, tg_user_id=None, tg_chat_id=None, tg_message_id=None, note=None):
-        lead = self.env["crm.lead"].sudo().browse(int(lead_id))
-        if not lead.exists():
-            raise UserError(_("Zayavka topilmadi."))
-
-        vals = {
-            "lead_id": int(lead_id),
-            "usta_id": int(usta_id),
-            "state": "return",
-            "note": note or "",
-            "tg_user_id": str(tg_user_id or ""),
-            "tg_chat_id": str(tg_chat_id or ""),
-            "tg_message_id": str(tg_message_id or ""),
-        }
-        rec = self.sudo().create(vals)
+        return self._create_one("return", lead_id, usta_id, tg_user_id, tg_chat_id, tg_message_id, note)
+
+    def _create_one(self, state, lead_id, usta_id, tg_user_id, tg_chat_id, tg_message_id, note):
+        res = self.create_events([{
+            "state": state,
+            "lead_id": lead_id,
+            "usta_id": usta_id,
+            "tg_user_id": tg_user_id,
+            "tg_chat_id": tg_chat_id,
+            "tg_message_id": tg_message_id,
+            "note": note,
+        }])[0]
+        if res["status"] == "error":
+            raise UserError(res["error"])
+        return self.sudo().browse(res["id"])
 
-        return rec
+    @api.model
+    def create_events(self, events):
+        """Record many take/return events at once (Telegram bot buffer flush).
+
+        events: [{state, lead_id, usta_id, tg_user_id, tg_chat_id, tg_message_id, note}, ...]
+        Returns one {"id", "status": created|duplicate|error, "error"} per event, in order.
+        An event whose (tg_chat_id, tg_message_id) is already stored is not created again.
+        """
+        results = [None] * len(events)
+        vals_by_index = {}
+        for i, ev in enumerate(events):
+            try:
+                vals = {
+                    "lead_id": int(ev.get("lead_id") or 0),
+                    "usta_id": int(ev.get("usta_id") or 0),
+                    "state": ev.get("state") or "take",
+                    "note": ev.get("note") or "",
+                    "tg_user_id": str(ev.get("tg_user_id") or ""),
+                    "tg_chat_id": str(ev.get("tg_chat_id") or ""),
+                    "tg_message_id": str(ev.get("tg_message_id") or ""),
+                }
+            except (TypeError, ValueError):
+                results[i] = {"id": False, "status": "error", "error": _("Noto'g'ri ma'lumot.")}
+                continue
+            if vals["state"] not in ("take", "return"):
+                results[i] = {"id": False, "status": "error", "error": _("Noto'g'ri holat.")}
+                continue
+            vals_by_index[i] = vals
+
+        # validate leads and ustalar in one query each
+        cr = self.env.cr
+        cr.execute("SELECT id FROM crm_lead WHERE id = ANY(%s)",
+                   ([v["lead_id"] for v in vals_by_index.values()],))
+        lead_ids = {r[0] for r in cr.fetchall()}
+        cr.execute("SELECT id FROM cc_employee WHERE id = ANY(%s)",
+                   ([v["usta_id"] for v in vals_by_index.values()],))
+        usta_ids = {r[0] for r in cr.fetchall()}
+        for i, vals in list(vals_by_index.items()):
+            if vals["lead_id"] not in lead_ids:
+                results[i] = {"id": False, "status": "error", "error": _("Zayavka topilmadi.")}
+            elif vals["usta_id"] not in usta_ids:
+                results[i] = {"id": False, "status": "error", "error": _("Usta topilmadi.")}
+            else:
+                continue
+            del vals_by_index[i]
+
+        for _attempt in range(2):
+            existing = self._ids_by_tg_key([_tg_key(v) for v in vals_by_index.values()])
+            todo, seen = [], {}
+            for i, vals in vals_by_index.items():
+                key = _tg_key(vals)
+                if key and key in existing:
+                    results[i] = {"id": existing[key], "status": "duplicate", "error": False}
+                elif key and key in seen:
+                    seen[key].append(i)  # repeated inside the batch: resolved after create
+                else:
+                    todo.append(i)
+                    if key:
+                        seen[key] = []
+            try:
+                with cr.savepoint():
+                    records = self.sudo().create([vals_by_index[i] for i in todo])
+                break
+            except psycopg2.IntegrityError:
+                # a concurrent flush stored some of the same messages: look them up again
+                continue
+        else:
+            raise UserError(_("Take/return hodisalarini saqlab bo'lmadi."))
+
+        for i, rec in zip(todo, records):
+            results[i] = {"id": rec.id, "status": "created", "error": False}
+            for j in seen.get(_tg_key(vals_by_index[i]), ()):
+                results[j] = {"id": rec.id, "status": "duplicate", "error": False}
+        return results
+
+    @api.model
+    def _ids_by_tg_key(self, keys):
+        keys = [k for k in keys if k]
+        if not keys:
+            return {}
+        self.flush_model(["tg_chat_id", "tg_message_id"])
+        self.env.cr.execute("""
+            SELECT tg_chat_id, tg_message_id, id
+              FROM crmproduct_work
+             WHERE (tg_chat_id, tg_message_id) IN (SELECT * FROM unnest(%s::varchar[], %s::varchar[]))
+        """, ([k[0] for k in keys], [k[1] for k in keys]))
+        return {(chat, msg): rid for chat, msg, rid in self.env.cr.fetchall()}
 
 
 from odoo import api, fields, models
 
+# debug-only, sampled: one change in PRODWORK_LOG_SAMPLE is logged
+_prodwork_logger = logging.getLogger(__name__ + ".prodwork_state")
+PRODWORK_LOG_SAMPLE = 100
+_prodwork_log_counter = itertools.count()
+
+
 class CrmLead(models.Model):
     _inherit = "crm.lead"
 
@@ -181,37 +421,58 @@ class CrmLead(models.Model):
         compute="_compute_prodwork_state",
         store=False,
     )
-
-    @api.depends("usta_id")
+    # latest crmproduct_work row of the lead, kept up to date by CrmProductWork.create()
+    prodwork_last_state = fields.Selection(
+        [("take", "Olib ketdi"), ("return", "Qaytardi")], readonly=True, copy=False,
+    )
+    prodwork_last_usta_id = fields.Many2one("cc.employee", readonly=True, copy=False)
+
+    def _prodwork_latest_states(self):
+        """{(lead_id, usta_id): state} and {lead_id: state} of the newest work rows, one query."""
+        ids = [i for i in self.ids if i]
+        by_usta, by_lead = {}, {}
+        if not ids:
+            return by_usta, by_lead
+        self.env["crmproduct_work"].flush_model()
+        self.env.cr.execute("""
+            SELECT DISTINCT ON (lead_id, usta_id) lead_id, usta_id, state, create_date, id
+              FROM crmproduct_work
+             WHERE lead_id = ANY(%s)
+             ORDER BY lead_id, usta_id, create_date DESC, id DESC
+        """, (ids,))
+        newest = {}
+        for lead_id, usta_id, state, create_date, rid in self.env.cr.fetchall():
+            by_usta[(lead_id, usta_id)] = state
+            if lead_id not in newest or (create_date, rid) > newest[lead_id]:
+                newest[lead_id] = (create_date, rid)
+                by_lead[lead_id] = state
+        return by_usta, by_lead
+
+    @api.depends("usta_id", "prodwork_last_state", "prodwork_last_usta_id")
     def _compute_prodwork_state(self):
-        Work = self.env["crmproduct_work"].sudo()
-
+        # fast path: the stored pointer already belongs to the lead's usta (or there is no usta)
+        fallback = self.browse()
         for lead in self:
-            old = lead.prodwork_state  # may be False/None in compute context
-            new = False
-
-            if lead.id:
-                domain = [("lead_id", "=", lead.id)]
-                if lead.usta_id:
-                    domain.append(("usta_id", "=", lead.usta_id.id))
-
-                last = Work.search(domain, order="create_date desc, id desc", limit=1)
-
-                if not last and lead.usta_id:
-                    last = Work.search([("lead_id", "=", lead.id)],
-                                       order="create_date desc, id desc", limit=1)
-
-                new = last.state if last else False
-
-            lead.prodwork_state = new
-
-            # ✅ LOG (only when something actually changes)
-            if old != new:
-                _logger.warning(
-                    "[PRODWORK_STATE] lead_id=%s service=%s usta_id=%s old=%s new=%s",
-                    lead.id,
-                    getattr(lead, "service_number", None),
-                    lead.usta_id.id if lead.usta_id else None,
-                    old,
-                    new,
-                )
\ No newline at end of file
+            if lead.prodwork_last_state and (
+                not lead.usta_id or lead.usta_id == lead.prodwork_last_usta_id
+            ):
+                lead._set_prodwork_state(lead.prodwork_last_state)
+            elif lead.id and lead.prodwork_last_state:
+                fallback |= lead
+            else:
+                lead._set_prodwork_state(False)
+
+        by_usta, by_lead = fallback._prodwork_latest_states()
+        for lead in fallback:
+            state = by_usta.get((lead.id, lead.usta_id.id)) or by_lead.get(lead.id) or False
+            lead._set_prodwork_state(state)
+
+    def _set_prodwork_state(self, new):
+        old = self.prodwork_state  # may be False/None in compute context
+        self.prodwork_state = new
+        if old != new and _prodwork_logger.isEnabledFor(logging.DEBUG) \
+                and next(_prodwork_log_counter) % PRODWORK_LOG_SAMPLE == 0:
+            _prodwork_logger.debug(
+                "[PRODWORK_STATE] lead_id=%s service=%s usta_id=%s old=%s new=%s",
+                self.id, self.service_number, self.usta_id.id or None, old, new,
+            )
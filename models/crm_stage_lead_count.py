@@ -1,23 +1,119 @@
-from odoo import api, fields, models
+import threading
+import time
+
+from odoo import api, fields, models, tools
+
+STAGE_COUNT_TTL = 30  # seconds; other workers see lead moves after at most this long
+STAGE_COUNT_MAX_KEYS = 512
+# what the registry-cached stage maps (_stage_title_map, _stage_role_map) read;
+# folding or reordering stages must not flush every ormcache in every worker
+STAGE_CACHE_FIELDS = ("name", "is_won", "stage_role", "active")
+
+# (dbname, uid, company_ids, domain) -> (expires_at, {stage_id: count})
+_STAGE_COUNT_CACHE = {}
+_STAGE_COUNT_LOCK = threading.Lock()
+
+
+def _invalidate_stage_counts(dbname):
+    with _STAGE_COUNT_LOCK:
+        for key in [k for k in _STAGE_COUNT_CACHE if k[0] == dbname]:
+            del _STAGE_COUNT_CACHE[key]
+
+
+def _invalidate_stage_counts_on_commit(cr):
+    """Drop the database's cached counts once the transaction commits (registered once per
+    transaction): before that, other requests would only re-cache the old counts."""
+    if not cr.postcommit.data.get("crm_office_ui.stage_counts"):
+        cr.postcommit.data["crm_office_ui.stage_counts"] = True
+        dbname = cr.dbname
+        cr.postcommit.add(lambda: _invalidate_stage_counts(dbname))
+
 
 class CRMStage(models.Model):
     _inherit = "crm.stage"
 
     lead_count = fields.Integer(compute="_compute_lead_count", store=False)
 
+    @api.model
+    @tools.ormcache('self.env.lang')
+    def _stage_title_map(self):
+        """({stage name: (ids...)}, (won stage ids...)) — cached per registry, cleared on stage changes."""
+        titles = {}
+        won = []
+        for st in self.sudo().search_read([], ["name", "is_won"]):
+            titles.setdefault(st["name"], []).append(st["id"])
+            if st["is_won"]:
+                won.append(st["id"])
+        return {k: tuple(v) for k, v in titles.items()}, tuple(won)
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        res = super().create(vals_list)
+        self.env.registry.clear_cache()
+        return res
+
+    def write(self, vals):
+        res = super().write(vals)
+        if any(f in vals for f in STAGE_CACHE_FIELDS):
+            self.env.registry.clear_cache()
+        return res
+
+    def unlink(self):
+        res = super().unlink()
+        self.env.registry.clear_cache()
+        return res
+
+    @api.model
+    def get_lead_counts(self, domain=None):
+        """{stage_id: lead count} for the caller's domain (all leads by default).
+
+        Results are cached per user and domain for STAGE_COUNT_TTL seconds and dropped
+        in this worker as soon as a lead stage change is committed.
+        """
+        domain = list(domain or [])
+        key = (self.env.cr.dbname, self.env.uid, tuple(self.env.companies.ids), repr(domain))
+        now = time.monotonic()
+        with _STAGE_COUNT_LOCK:
+            hit = _STAGE_COUNT_CACHE.get(key)
+        if hit and hit[0] > now:
+            return hit[1]
+        rows = self.env['crm.lead'].read_group(domain, ['stage_id'], ['stage_id'])
+        counts = {
+            r['stage_id'][0]: r.get('stage_id_count', r.get('__count', 0)) or 0
+            for r in rows if r.get('stage_id')
+        }
+        with _STAGE_COUNT_LOCK:
+            if len(_STAGE_COUNT_CACHE) >= STAGE_COUNT_MAX_KEYS:
+                _STAGE_COUNT_CACHE.clear()
+            _STAGE_COUNT_CACHE[key] = (now + STAGE_COUNT_TTL, counts)
+        return counts
+
     def _compute_lead_count(self):
-        cnt = {sid: 0 for sid in self.ids}
-        if self.ids:
-            rows = self.env['crm.lead'].read_group(
-                [('stage_id', 'in', self.ids)], ['stage_id'], ['stage_id']
-            )
-            for r in rows:
-                sid = r['stage_id'][0]
-                cnt[sid] = r.get('stage_id_count', r.get('__count', 0)) or 0
+        counts = self.get_lead_counts(self.env.context.get('stage_count_domain'))
         for s in self:
-            s.lead_count = cnt.get(s.id, 0)
+            s.lead_count = counts.get(s.id, 0)
 
     def name_get(self):
         base = super().name_get()
         m = {s.id: s.lead_count for s in self}
         return [(sid, f"{name} ({m.get(sid, 0)})") for sid, name in base]
+
+
+class CrmLead(models.Model):
+    _inherit = "crm.lead"
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        leads = super().create(vals_list)
+        _invalidate_stage_counts_on_commit(self.env.cr)
+        return leads
+
+    def _write_after(self, vals, before):
+        super()._write_after(vals, before)
+        if 'stage_id' in vals or 'active' in vals:
+            _invalidate_stage_counts_on_commit(self.env.cr)
+
+    def unlink(self):
+        res = super().unlink()
+        _invalidate_stage_counts_on_commit(self.env.cr)
+        return res
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+from odoo import api, fields, models, tools
+
+STAGE_ROLES = [
+    ("new", "Yangi"),
+    ("accept", "Qabul qilindi"),
+    ("reject", "Qabul qilinmadi"),
+    ("progress", "Jarayonda"),
+    ("done", "Ish yakunlandi"),
+    ("confirm", "Tasdiqlandi"),
+    ("cancel", "Bekor qilindi"),
+    ("other", "Boshqa"),
+]
+
+# Checked in order: "Qabul qilinmadi" must not be taken for an accept stage.
+_ROLE_KEYS = [
+    ("reject", ("qilinmadi", "reject")),
+    ("cancel", ("bekor", "cancel", "lost")),
+    ("confirm", ("tasdiq", "confirm")),
+    ("done", ("yakun", "done", "finish")),
+    ("progress", ("jarayon", "progress")),
+    ("accept", ("qabul", "accept", "waiting", "kutil")),
+    ("new", ("yangi", "new", "draft", "assigned", "so'rov", "so‘rov")),
+]
+
+# Stages that close the Accept→Done work interval
+WORK_DONE_ROLES = ("done", "confirm")
+
+
+def guess_stage_role(name):
+    nm = (name or "").lower()
+    for role, keys in _ROLE_KEYS:
+        if any(k in nm for k in keys):
+            return role
+    return "other"
+
+
+class CrmStage(models.Model):
+    _inherit = "crm.stage"
+
+    stage_role = fields.Selection(
+        STAGE_ROLES,
+        string="Bosqich roli",
+        compute="_compute_stage_role",
+        store=True,
+        readonly=False,
+        index=True,
+        help="Vaqt belgilari, SMS va Telegram xabarlari shu rol bo'yicha ishlaydi. "
+             "Nomdan avtomatik aniqlanadi, kerak bo'lsa qo'lda o'zgartiring.",
+    )
+
+    @api.depends("name")
+    def _compute_stage_role(self):
+        for st in self:
+            st.stage_role = guess_stage_role(st.name)
+
+    @api.model
+    @tools.ormcache()
+    def _stage_role_map(self):
+        """{stage_id: role} — cached per registry, cleared on stage changes."""
+        self.flush_model(["stage_role"])
+        self.env.cr.execute("SELECT id, stage_role FROM crm_stage")
+        return dict(self.env.cr.fetchall())
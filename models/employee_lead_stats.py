@@ -11,6 +11,17 @@ STAGE_TITLES = [
     "Bekor qilindi",
 ]
 
+# counter field -> stage title
+STAGE_COUNTERS = {
+    "lead_stage_new_count": "Yangi so'rovlar",
+    "lead_stage_qabul_count": "Qabul qilindi",
+    "lead_stage_qabul_qilinmadi_count": "Qabul qilinmadi",
+    "lead_stage_jarayonda_count": "Jarayonda",
+    "lead_stage_yakun_count": "Ish yakunlandi",
+    "lead_stage_tasdiqlandi_count": "Tasdiqlandi",
+    "lead_stage_bekor_count": "Bekor qilindi",
+}
+
 class CcEmployee(models.Model):
     _inherit = "cc.employee"
 
@@ -28,49 +39,29 @@ class CcEmployee(models.Model):
     lead_stage_bekor_count             = fields.Integer(string="Bekor qilindi",     compute="_compute_lead_stats", store=False)
 
     def _compute_lead_stats(self):
-        Lead = self.env["crm.lead"].sudo()
+        titles, won_ids = self.env["crm.stage"]._stage_title_map()
+        won_ids = set(won_ids)
 
-        # Build map: title -> [stage_ids]
-        stage_map = {}
-        if STAGE_TITLES:
-            stages = self.env["crm.stage"].sudo().search([("name", "in", STAGE_TITLES)])
-            for st in stages:
-                stage_map.setdefault(st.name, []).append(st.id)
+        # usta_id -> {stage_id: count}, read from the incrementally maintained counter table
+        counts = self.env["crm.lead.usta.stage.count"]._counts_for([i for i in self.ids if i])
 
         for emp in self:
-            # defaults
-            emp.lead_active_count = 0
-            emp.lead_done_count = 0
-            emp.lead_stage_new_count = 0
-            emp.lead_stage_qabul_count = 0
-            emp.lead_stage_qabul_qilinmadi_count = 0
-            emp.lead_stage_jarayonda_count = 0
-            emp.lead_stage_yakun_count = 0
-            emp.lead_stage_tasdiqlandi_count = 0
-            emp.lead_stage_bekor_count = 0
-
-            if not emp.id:
-                continue
-
-            base = [("usta_id", "=", emp.id), ("active", "=", True)]
-
-            # totals
-            emp.lead_active_count = Lead.search_count(base + [("stage_id.is_won", "=", False)])
-            emp.lead_done_count   = Lead.search_count(base + [("stage_id.is_won", "=", True)])
-
-            # helper
-            def count_for(title):
-                ids = stage_map.get(title, [])
-                return Lead.search_count(base + [("stage_id", "in", ids)]) if ids else 0
-
-            # per-stage
-            emp.lead_stage_new_count             = count_for("Yangi so'rovlar")
-            emp.lead_stage_qabul_count           = count_for("Qabul qilindi")
-            emp.lead_stage_qabul_qilinmadi_count = count_for("Qabul qilinmadi")
-            emp.lead_stage_jarayonda_count       = count_for("Jarayonda")
-            emp.lead_stage_yakun_count           = count_for("Ish yakunlandi")
-            emp.lead_stage_tasdiqlandi_count     = count_for("Tasdiqlandi")
-            emp.lead_stage_bekor_count           = count_for("Bekor qilindi")
+            per_stage = counts.get(emp.id, {})
+            emp.lead_active_count = sum(c for sid, c in per_stage.items() if sid not in won_ids)
+            emp.lead_done_count = sum(c for sid, c in per_stage.items() if sid in won_ids)
+            for fname, title in STAGE_COUNTERS.items():
+                emp[fname] = sum(per_stage.get(sid, 0) for sid in titles.get(title, ()))
+
+    @api.model
+    def _active_lead_loads(self, usta_ids):
+        """{usta_id: active (not won) lead count} — same rule as lead_active_count."""
+        _titles, won_ids = self.env["crm.stage"]._stage_title_map()
+        won_ids = set(won_ids)
+        counts = self.env["crm.lead.usta.stage.count"]._counts_for(list(usta_ids))
+        return {
+            usta_id: sum(c for sid, c in counts.get(usta_id, {}).items() if sid not in won_ids)
+            for usta_id in usta_ids
+        }
 
     # === Open helpers (unchanged) ===
     def _action_open_leads(self, extra_domain=None, name="Murojaatlar"):
@@ -106,7 +97,7 @@ class CcEmployee(models.Model):
 
     def _open_by_stage(self, title):
         self.ensure_one()
-        stage_ids = self.env['crm.stage'].sudo().search([('name', '=', title)]).ids
+        stage_ids = list(self.env['crm.stage']._stage_title_map()[0].get(title, ()))
         return self._action_open_leads(
             extra_domain=[('stage_id', 'in', stage_ids), ('active', '=', True)],
             name=title
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+import base64
+import logging
+
+from odoo import api, models
+from odoo.tools.image import image_process
+
+_logger = logging.getLogger(__name__)
+
+PHOTO_MAX_SIDE = 1920
+PHOTO_QUALITY = 80
+PHOTO_MIN_BYTES = 256 * 1024  # smaller files are already phone/bot-compressed
+PHOTO_MIMETYPES = ("image/jpeg", "image/png", "image/webp")
+
+
+def shrink_photo(raw, mimetype="image/jpeg"):
+    """Cap the resolution, recompress and drop EXIF; returns ``raw`` when nothing is gained."""
+    if not raw or len(raw) < PHOTO_MIN_BYTES or mimetype not in PHOTO_MIMETYPES:
+        return raw
+    try:
+        out = image_process(raw, size=(PHOTO_MAX_SIDE, PHOTO_MAX_SIDE), quality=PHOTO_QUALITY)
+    except Exception as e:  # broken / unsupported image: store as received
+        _logger.info("photo ingest: left as is (%s)", e)
+        return raw
+    return out if out and len(out) < len(raw) else raw
+
+
+class IrAttachment(models.Model):
+    _inherit = "ir.attachment"
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        for vals in vals_list:
+            if vals.get("res_model") == "crm.lead":
+                self._shrink_lead_photo_vals(vals)
+        return super().create(vals_list)
+
+    def _shrink_lead_photo_vals(self, vals):
+        raw = vals.get("raw")
+        if raw is None and vals.get("datas"):
+            raw = base64.b64decode(vals["datas"])
+        if not raw or len(raw) < PHOTO_MIN_BYTES:
+            return
+        mimetype = self._compute_mimetype(dict(vals, raw=raw))
+        out = shrink_photo(raw, mimetype)
+        if out is raw:
+            return
+        vals.pop("datas", None)
+        vals["raw"] = out
+
+
+class CrmLead(models.Model):
+    _inherit = "crm.lead"
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        leads = super().create(vals_list)
+        if any("photo_attachment_ids" in vals for vals in vals_list):
+            leads._dedupe_photo_attachments()
+        return leads
+
+    def _write_after(self, vals, before):
+        super()._write_after(vals, before)
+        if "photo_attachment_ids" in vals:
+            self._dedupe_photo_attachments()
+
+    def _message_post_after_hook(self, message, msg_vals):
+        res = super()._message_post_after_hook(message, msg_vals)
+        if message.attachment_ids:
+            self._dedupe_photo_attachments()
+        return res
+
+    def _dedupe_photo_attachments(self):
+        """Collapse identical images (same checksum) of a lead onto the oldest attachment.
+
+        Looks at both the photo report (crm_lead_photo_rel) and chatter attachments. The
+        lead's photo links always move to the kept attachment; a copy is only deleted (after
+        its chatter references moved too) when the lead owns it and nothing else points at it.
+        """
+        if not self.ids:
+            return
+        self.env["ir.attachment"].flush_model(["checksum", "res_model", "res_id", "mimetype"])
+        self.flush_model(["photo_attachment_ids"])
+        cr = self.env.cr
+        cr.execute("""
+            WITH photos AS (
+                SELECT r.lead_id, a.id, a.checksum
+                  FROM crm_lead_photo_rel r
+                  JOIN ir_attachment a ON a.id = r.attachment_id
+                 WHERE r.lead_id = ANY(%(ids)s)
+                 UNION
+                SELECT a.res_id, a.id, a.checksum
+                  FROM ir_attachment a
+                 WHERE a.res_model = 'crm.lead' AND a.res_id = ANY(%(ids)s)
+                   AND a.mimetype LIKE 'image/%%'
+            )
+            SELECT d.id, d.keep_id, d.lead_id, (a.res_model = 'crm.lead' AND a.res_id = d.lead_id)
+              FROM (
+                SELECT lead_id, id, min(id) OVER (PARTITION BY lead_id, checksum) AS keep_id
+                  FROM photos WHERE checksum IS NOT NULL
+              ) d
+              JOIN ir_attachment a ON a.id = d.id
+             WHERE d.id <> d.keep_id
+        """, {"ids": self.ids})
+        dupes = cr.fetchall()
+        if not dupes:
+            return
+        shared = self._attachments_used_elsewhere([(dup_id, lead_id) for dup_id, _keep, lead_id, _own in dupes])
+        removable = [row for row in dupes if row[3] and row[0] not in shared]
+
+        def repoint(table, owner, rows, own_rows_only):
+            values = ", ".join(["(%s, %s, %s)"] * len(rows))
+            params = [x for dup_id, keep_id, lead_id, _own in rows for x in (dup_id, keep_id, lead_id)]
+            scope = "AND t.lead_id = v.lead_id" if own_rows_only else ""
+            # point owners at the kept copy, then drop the rows that now duplicate it
+            cr.execute(f"""
+                INSERT INTO {table} ({owner}, attachment_id)
+                SELECT t.{owner}, v.keep_id
+                  FROM {table} t JOIN (VALUES {values}) AS v(dup_id, keep_id, lead_id)
+                       ON t.attachment_id = v.dup_id {scope}
+                ON CONFLICT DO NOTHING
+            """, params)
+            cr.execute(f"""
+                DELETE FROM {table} t USING (VALUES {values}) AS v(dup_id, keep_id, lead_id)
+                 WHERE t.attachment_id = v.dup_id {scope}
+            """, params)
+
+        repoint("crm_lead_photo_rel", "lead_id", dupes, True)
+        if removable:
+            # nothing outside this lead's chatter refers to these copies
+            repoint("message_attachment_rel", "message_id", removable, False)
+        self.invalidate_recordset(["photo_attachment_ids"])
+        self.env["mail.message"].invalidate_model(["attachment_ids"])
+        self.env["ir.attachment"].sudo().browse([row[0] for row in removable]).unlink()
+        _logger.info("crm.lead %s: %s duplicate photo(s) unlinked, %s deleted", self.ids, len(dupes), len(removable))
+
+    def _attachments_used_elsewhere(self, pairs):
+        """Attachment ids of ``pairs`` [(attachment_id, lead_id)] that any stored relation other
+        than that lead's own photo report or chatter points at."""
+        checks = []
+        for model in self.env.values():
+            if model._abstract or not model._auto:
+                continue
+            for field in model._fields.values():
+                if not field.store or field.comodel_name != "ir.attachment":
+                    continue
+                if field.type == "many2many" and field.relation == "crm_lead_photo_rel":
+                    checks.append("SELECT r.attachment_id FROM crm_lead_photo_rel r "
+                                  "JOIN v ON v.att = r.attachment_id WHERE r.lead_id <> v.lead")
+                elif field.type == "many2many" and field.relation == "message_attachment_rel":
+                    checks.append("SELECT r.attachment_id FROM message_attachment_rel r "
+                                  "JOIN v ON v.att = r.attachment_id JOIN mail_message m ON m.id = r.message_id "
+                                  "WHERE m.model IS DISTINCT FROM 'crm.lead' OR m.res_id IS DISTINCT FROM v.lead")
+                elif field.type == "many2many":
+                    checks.append(f'SELECT r."{field.column2}" FROM "{field.relation}" r JOIN v ON v.att = r."{field.column2}"')
+                elif field.type == "many2one":
+                    checks.append(f'SELECT t."{field.name}" FROM "{model._table}" t JOIN v ON v.att = t."{field.name}"')
+        if not checks:
+            return set()
+        values = ", ".join(["(%s, %s)"] * len(pairs))
+        self.env.flush_all()
+        self.env.cr.execute(f"""
+            WITH v(att, lead) AS (VALUES {values})
+            SELECT DISTINCT att FROM ({" UNION ".join(dict.fromkeys(checks))}) AS used(att)
+        """, [x for pair in pairs for x in pair])
+        return {r[0] for r in self.env.cr.fetchall()}
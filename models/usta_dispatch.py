@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+import logging
+
+from odoo import api, models, _
+
+_logger = logging.getLogger(__name__)
+
+PARAM_DISPATCH_MAX_LOAD = "crm_office_ui.dispatch_max_load"  # active leads per usta
+PARAM_DISPATCH_LOAD_KM = "crm_office_ui.dispatch_load_km"  # one active lead weighs as much as N km
+DISPATCH_CANDIDATES = 10
+
+
+class CrmLead(models.Model):
+    _inherit = "crm.lead"
+
+    @api.model
+    def _dispatch_new_leads(self, batch_size=500, dry_run=False):
+        """Assign unassigned leads of "new" stages to ustalar, oldest first.
+
+        Candidates are the eligible ustalar (region, else state — the _validate_usta_region
+        rule) nearest to the lead's stored coordinates; each is scored distance + load penalty
+        with the load updated as the batch is assigned. Leads without coordinates (or without
+        a free eligible usta on the grid) take their candidates from the region/state map,
+        ustalar without coordinates included, and go to the least loaded one.
+        Returns the proposals; dry_run only reports them.
+        """
+        ICP = self.env["ir.config_parameter"].sudo()
+        max_load = int(ICP.get_param(PARAM_DISPATCH_MAX_LOAD, "10") or 10)
+        load_km = float(ICP.get_param(PARAM_DISPATCH_LOAD_KM, "5") or 5)
+
+        roles = self.env["crm.stage"]._stage_role_map()
+        new_stage_ids = [sid for sid, role in roles.items() if role == "new"]
+        if not new_stage_ids:
+            return []
+        self.flush_model(["usta_id", "stage_id", "active", "region_id", "state_id", "location_lat", "location_lng"])
+        # rows are locked until commit so an operator's assignment waits instead of being
+        # overwritten; leads someone is editing right now are left for the next run
+        self.env.cr.execute(f"""
+            SELECT id, region_id, state_id, location_lat, location_lng
+              FROM crm_lead
+             WHERE active AND usta_id IS NULL AND stage_id = ANY(%s)
+               AND (region_id IS NOT NULL OR state_id IS NOT NULL)
+             ORDER BY create_date, id
+             LIMIT %s
+             {"" if dry_run else "FOR UPDATE SKIP LOCKED"}
+        """, (new_stage_ids, batch_size))
+        queue = self.env.cr.fetchall()
+        if not queue:
+            return []
+
+        Employee = self.env["cc.employee"]
+        grid = Employee._usta_grid()
+        loads = Employee._active_lead_loads(list(Employee._ustalar_for_area() | set(grid.points)))
+
+        def free(candidates):
+            return [(u, km) for u, km in candidates if loads.get(u, 0) < max_load]
+
+        proposals = []
+        for lead_id, region_id, state_id, lat, lng in queue:
+            candidates = []
+            if lat and lng:
+                candidates = free(grid.nearest(lat, lng, DISPATCH_CANDIDATES, region_id, state_id))
+                if not candidates:
+                    # the nearest ones are all full: look at every eligible usta on the grid
+                    candidates = free(grid.nearest(lat, lng, len(grid.points), region_id, state_id))
+            if not candidates:
+                # no coordinates on either side: every eligible usta, least loaded first
+                candidates = free((u, None) for u in Employee._ustalar_for_area(region_id, state_id))
+            if not candidates:
+                continue
+            usta_id, km = min(candidates, key=lambda c: ((c[1] or 0.0) + load_km * loads.get(c[0], 0), c[0]))
+            proposals.append({
+                "lead_id": lead_id,
+                "usta_id": usta_id,
+                "distance_km": round(km, 3) if km is not None else False,
+                "load": loads.get(usta_id, 0),
+            })
+            loads[usta_id] = loads.get(usta_id, 0) + 1
+
+        if dry_run or not proposals:
+            return proposals
+        leads = self.browse([p["lead_id"] for p in proposals]).sudo()
+        leads.invalidate_recordset(["usta_id"])
+        still_free = set(leads.filtered(lambda l: not l.usta_id).ids)
+        proposals = [p for p in proposals if p["lead_id"] in still_free]
+        by_usta = {}
+        for p in proposals:
+            by_usta.setdefault(p["usta_id"], []).append(p["lead_id"])
+        for usta_id, lead_ids in by_usta.items():
+            self.browse(lead_ids).sudo().write({"usta_id": usta_id})
+        _logger.info("crm.lead dispatch: %s leads assigned to %s ustalar", len(proposals), len(by_usta))
+        return proposals
+
+    @api.model
+    def _cron_dispatch_new_leads(self, batch_size=500):
+        return len(self._dispatch_new_leads(batch_size=batch_size))
+
+    @api.model
+    def action_dispatch_dry_run(self):
+        """Server action: show what the dispatcher would assign now, without writing."""
+        proposals = self._dispatch_new_leads(dry_run=True)
+        leads = self.browse([p["lead_id"] for p in proposals])
+        ustalar = self.env["cc.employee"].sudo().browse([p["usta_id"] for p in proposals])
+        lead_names = dict(leads.mapped(lambda l: (l.id, l.service_number or l.name)))
+        usta_names = dict(ustalar.mapped(lambda e: (e.id, e.name)))
+        lines = [
+            "%s → %s (%s km, %s ta faol)" % (
+                lead_names.get(p["lead_id"]), usta_names.get(p["usta_id"]),
+                p["distance_km"] if p["distance_km"] is not False else "?", p["load"],
+            )
+            for p in proposals[:30]
+        ]
+        return {
+            "type": "ir.actions.client",
+            "tag": "display_notification",
+            "params": {
+                "title": _("Taqsimlash (sinov): %s ta murojaat") % len(proposals),
+                "message": "\n".join(lines) or _("Taqsimlanadigan murojaat yo'q."),
+                "sticky": True,
+            },
+        }
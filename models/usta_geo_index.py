@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+import math
+import threading
+
+from odoo import api, models
+
+from .crm_lead import _haversine_km_many
+
+GRID_CELL_DEG = 0.1  # ~11 km north-south
+KM_PER_DEG = 111.32
+MAX_RINGS = 60  # beyond ~6° the remaining ustalar are scanned directly
+
+_INDEXES = {}  # dbname -> _UstaGrid
+_INDEX_LOCK = threading.Lock()
+
+
+def _cell(lat, lng):
+    return int(math.floor(lat / GRID_CELL_DEG)), int(math.floor(lng / GRID_CELL_DEG))
+
+
+def _ring_cells(cx, cy, ring):
+    """Cells on the border of the (2*ring+1)² square around (cx, cy)."""
+    if ring == 0:
+        yield cx, cy
+        return
+    for ix in range(cx - ring, cx + ring + 1):
+        yield ix, cy - ring
+        yield ix, cy + ring
+    for iy in range(cy - ring + 1, cy + ring):
+        yield cx - ring, iy
+        yield cx + ring, iy
+
+
+class _UstaGrid:
+    """Active ustalar with coordinates bucketed in GRID_CELL_DEG cells, plus their service areas."""
+
+    def __init__(self):
+        self.stamp = None  # _grid_stamp() of the rows loaded
+        self.points = {}  # usta_id -> (lat, lng)
+        self.regions = {}  # usta_id -> frozenset(cc.region ids)
+        self.states = {}  # usta_id -> frozenset(res.country.state ids)
+        self.cells = {}  # (ix, iy) -> set(usta_id)
+
+    def put(self, usta_id, lat, lng, region_ids, state_ids):
+        self.drop(usta_id)
+        self.points[usta_id] = (lat, lng)
+        self.regions[usta_id] = frozenset(region_ids)
+        self.states[usta_id] = frozenset(state_ids)
+        self.cells.setdefault(_cell(lat, lng), set()).add(usta_id)
+
+    def drop(self, usta_id):
+        pt = self.points.pop(usta_id, None)
+        self.regions.pop(usta_id, None)
+        self.states.pop(usta_id, None)
+        if pt:
+            bucket = self.cells.get(_cell(*pt))
+            if bucket:
+                bucket.discard(usta_id)
+                if not bucket:
+                    del self.cells[_cell(*pt)]
+
+    def eligible(self, usta_id, region_id=None, state_id=None):
+        # same rule as crm.lead._validate_usta_region / _onchange_location_filter_usta
+        if region_id:
+            return region_id in self.regions.get(usta_id, ())
+        if state_id:
+            return state_id in self.states.get(usta_id, ())
+        return True
+
+    def nearest(self, lat, lng, k, region_id=None, state_id=None):
+        """[(usta_id, km)] of the k nearest eligible ustalar, walking grid rings outwards."""
+        cx, cy = _cell(lat, lng)
+        found, seen = [], set()
+        for ring in range(MAX_RINGS + 1):
+            ids = [
+                u for c in _ring_cells(cx, cy, ring)
+                for u in self.cells.get(c, ())
+                if self.eligible(u, region_id, state_id)
+            ]
+            found += self._measure(lat, lng, ids)
+            seen.update(ids)
+            found.sort(key=lambda r: r[1])
+            # anything in later rings is at least this far away
+            reach = ring * GRID_CELL_DEG * KM_PER_DEG * max(math.cos(math.radians(abs(lat) + ring * GRID_CELL_DEG)), 0.1)
+            if len(found) >= k and found[k - 1][1] <= reach:
+                return found[:k]
+        rest = [u for u in self.points if u not in seen and self.eligible(u, region_id, state_id)]
+        found = sorted(found + self._measure(lat, lng, rest), key=lambda r: r[1])
+        return found[:k]
+
+    def _measure(self, lat, lng, ids):
+        if not ids:
+            return []
+        pts = [self.points[u] for u in ids]
+        kms = _haversine_km_many([lat] * len(ids), [lng] * len(ids), [p[0] for p in pts], [p[1] for p in pts])
+        return list(zip(ids, kms))
+
+
+class CcEmployee(models.Model):
+    _inherit = "cc.employee"
+
+    @api.model
+    def _usta_grid(self):
+        """Process-wide grid for this database, rebuilt from cc_employee when it changed.
+
+        The probe also sums the write_dates: write_date is the transaction start, so a
+        transaction committing after a newer one leaves max(write_date) and count(*) as
+        they were. Any change rebuilds the whole grid (a few thousand rows at most) into
+        a new object, so readers in other threads keep using the old one meanwhile.
+        """
+        cr = self.env.cr
+        self.flush_model()
+        cr.execute("""
+            SELECT max(write_date), count(*), sum(extract(epoch FROM write_date))
+              FROM cc_employee
+        """)
+        stamp = cr.fetchone()
+        grid = _INDEXES.get(cr.dbname)
+        if grid and grid.stamp == stamp:
+            return grid
+        with _INDEX_LOCK:
+            grid = _INDEXES.get(cr.dbname)
+            if grid and grid.stamp == stamp:
+                return grid
+            grid = _UstaGrid()
+            emps = self.sudo().search_read(
+                [("is_usta", "=", True), ("geo_lat", "!=", False), ("geo_lng", "!=", False)],
+                ["geo_lat", "geo_lng", "service_region_ids", "state_ids"],
+            )
+            for emp in emps:
+                grid.put(emp["id"], emp["geo_lat"], emp["geo_lng"], emp["service_region_ids"], emp["state_ids"])
+            grid.stamp = stamp
+            _INDEXES[cr.dbname] = grid
+            return grid
+
+    @api.model
+    def nearest_ustalar(self, lat, lng, k=5, region_id=None, state_id=None):
+        """k nearest eligible active ustalar: [{usta_id, name, distance_km, load}] nearest first."""
+        if not (lat and lng):
+            return []
+        hits = self._usta_grid().nearest(float(lat), float(lng), int(k), region_id or None, state_id or None)
+        if not hits:
+            return []
+        ids = [u for u, _km in hits]
+        loads = self._active_lead_loads(ids)
+        names = dict(self.sudo().browse(ids).mapped(lambda e: (e.id, e.name)))
+        return [{
+            "usta_id": u,
+            "name": names.get(u),
+            "distance_km": round(km, 3),
+            "load": loads.get(u, 0),
+        } for u, km in hits]
+
+
+class CrmLead(models.Model):
+    _inherit = "crm.lead"
+
+    def get_usta_suggestions(self, k=5):
+        """Nearest eligible ustalar for this lead's stored coordinates, with their active load."""
+        self.ensure_one()
+        return self.env["cc.employee"].nearest_ustalar(
+            self.location_lat, self.location_lng, k,
+            region_id=self.region_id.id, state_id=self.state_id.id,
+        )
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+from odoo import api, models, tools
+
+REGION_MAP_FIELDS = ("service_region_ids", "state_ids", "is_usta", "active")
+
+
+class CcEmployee(models.Model):
+    _inherit = "cc.employee"
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        res = super().create(vals_list)
+        if res._in_region_map():
+            self.env.registry.clear_cache()  # _usta_region_map
+        return res
+
+    def write(self, vals):
+        res = super().write(vals)
+        if any(f in vals for f in REGION_MAP_FIELDS):
+            self.env.registry.clear_cache()
+        return res
+
+    def unlink(self):
+        mapped = self._in_region_map()
+        res = super().unlink()
+        if mapped:
+            self.env.registry.clear_cache()
+        return res
+
+    def _in_region_map(self):
+        # employees without a service area who are not ustalar never show up in the map
+        return self.filtered(lambda e: e.is_usta or e.service_region_ids or e.state_ids)
+
+    @api.model
+    @tools.ormcache()
+    def _usta_region_map(self):
+        """(region_id -> employee ids, state_id -> employee ids, active usta ids), registry cached.
+
+        The two maps cover every employee (the constraint only looks at the service area);
+        the third set narrows them to what the usta_id onchange offers.
+        """
+        by_region, by_state = {}, {}
+        emps = self.sudo().with_context(active_test=False).search_read(
+            [], ["service_region_ids", "state_ids", "is_usta", "active"]
+        )
+        active = set()
+        for e in emps:
+            for rid in e["service_region_ids"]:
+                by_region.setdefault(rid, set()).add(e["id"])
+            for sid in e["state_ids"]:
+                by_state.setdefault(sid, set()).add(e["id"])
+            if e["is_usta"] and e["active"]:
+                active.add(e["id"])
+        return (
+            {k: frozenset(v) for k, v in by_region.items()},
+            {k: frozenset(v) for k, v in by_state.items()},
+            frozenset(active),
+        )
+
+    @api.model
+    def _ustalar_for_area(self, region_id=None, state_id=None):
+        """Active usta ids serving the region (or, without a region, the state)."""
+        by_region, by_state, active = self._usta_region_map()
+        if region_id:
+            return by_region.get(region_id, frozenset()) & active
+        if state_id:
+            return by_state.get(state_id, frozenset()) & active
+        return active
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+from collections import Counter
+
+from odoo import api, fields, models
+
+COUNTED_FIELDS = ("usta_id", "stage_id", "active")
+
+
+class CrmLeadUstaStageCount(models.Model):
+    """Active lead count per (usta, stage), maintained incrementally by crm.lead."""
+    _name = "crm.lead.usta.stage.count"
+    _description = "Usta / bosqich bo'yicha murojaatlar soni"
+    _log_access = False
+
+    usta_id = fields.Many2one("cc.employee", required=True, ondelete="cascade", index=True)
+    stage_id = fields.Many2one("crm.stage", required=True, ondelete="cascade")
+    lead_count = fields.Integer(default=0)
+
+    _sql_constraints = [
+        ("uniq_usta_stage", "unique(usta_id, stage_id)", "One counter per usta and stage."),
+    ]
+
+    def init(self):
+        self.env.cr.execute("SELECT 1 FROM crm_lead_usta_stage_count LIMIT 1")
+        if not self.env.cr.fetchone():
+            self._reconcile()
+
+    @api.model
+    def _apply_deltas(self, deltas):
+        """deltas: {(usta_id, stage_id): +/-n}; atomic upsert, rows locked in key order."""
+        deltas = sorted((k, v) for k, v in deltas.items() if v)
+        if not deltas:
+            return
+        values = ", ".join(["(%s, %s, %s)"] * len(deltas))
+        params = [x for (usta, stage), n in deltas for x in (usta, stage, n)]
+        self.env.cr.execute(f"""
+            INSERT INTO crm_lead_usta_stage_count (usta_id, stage_id, lead_count)
+            VALUES {values}
+            ON CONFLICT (usta_id, stage_id)
+            DO UPDATE SET lead_count = crm_lead_usta_stage_count.lead_count + EXCLUDED.lead_count
+        """, params)
+        self.invalidate_model(["lead_count"])
+
+    @api.model
+    def _reconcile(self):
+        """Rebuild every counter from crm_lead (cron safety net for SQL-level changes)."""
+        cr = self.env.cr
+        cr.execute("LOCK TABLE crm_lead_usta_stage_count IN EXCLUSIVE MODE")
+        cr.execute("DELETE FROM crm_lead_usta_stage_count")
+        cr.execute("""
+            INSERT INTO crm_lead_usta_stage_count (usta_id, stage_id, lead_count)
+            SELECT usta_id, stage_id, count(*)
+              FROM crm_lead
+             WHERE active AND usta_id IS NOT NULL AND stage_id IS NOT NULL
+             GROUP BY usta_id, stage_id
+        """)
+        self.invalidate_model()
+        return True
+
+    @api.model
+    def _counts_for(self, usta_ids):
+        """{usta_id: {stage_id: count}}"""
+        res = {}
+        if not usta_ids:
+            return res
+        self.env.cr.execute("""
+            SELECT usta_id, stage_id, lead_count
+              FROM crm_lead_usta_stage_count
+             WHERE usta_id = ANY(%s) AND lead_count <> 0
+        """, (list(usta_ids),))
+        for usta_id, stage_id, n in self.env.cr.fetchall():
+            res.setdefault(usta_id, {})[stage_id] = n
+        return res
+
+
+class CrmLead(models.Model):
+    _inherit = "crm.lead"
+
+    def _usta_stage_keys(self):
+        return Counter(
+            (r.usta_id.id, r.stage_id.id)
+            for r in self
+            if r.active and r.usta_id and r.stage_id
+        )
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        leads = super().create(vals_list)
+        self.env["crm.lead.usta.stage.count"]._apply_deltas(leads.sudo()._usta_stage_keys())
+        return leads
+
+    def _write_before(self, vals):
+        before = super()._write_before(vals)
+        # taken on every write: the ORM may recompute stage_id (e.g. after a team_id change)
+        # without it ever being in vals
+        before["usta_stage_keys"] = self.sudo()._usta_stage_keys()
+        return before
+
+    def _write_after(self, vals, before):
+        super()._write_after(vals, before)
+        if "usta_stage_keys" in before:
+            leads = self.sudo()
+            leads.flush_recordset(list(COUNTED_FIELDS))
+            deltas = Counter(leads._usta_stage_keys())
+            deltas.subtract(before["usta_stage_keys"])
+            self.env["crm.lead.usta.stage.count"]._apply_deltas(deltas)
+
+    def unlink(self):
+        deltas = Counter()
+        deltas.subtract(self.sudo()._usta_stage_keys())
+        res = super().unlink()
+        self.env["crm.lead.usta.stage.count"]._apply_deltas(deltas)
+        return res
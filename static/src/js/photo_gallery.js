@@ -0,0 +1,90 @@
+/** @odoo-module **/
+import { Component, onWillStart, onWillUpdateProps, useEffect, useRef, useState } from "@odoo/owl";
+import { registry } from "@web/core/registry";
+import { standardWidgetProps } from "@web/views/widgets/standard_widget_props";
+
+function photoIds(record) {
+    const list = record.data.photo_attachment_ids;
+    return (list?.currentIds || list?.records?.map((r) => r.resId) || []).join(",");
+}
+
+export class CrmPhotoGallery extends Component {
+    static template = "crm_office_ui.PhotoGallery";
+    static props = { ...standardWidgetProps };
+
+    setup() {
+        this.gridRef = useRef("grid");
+        this.state = useState({ photos: [], viewer: null });
+        this._key = null;
+        onWillStart(() => this._load(this.props));
+        onWillUpdateProps((next) => this._load(next));
+        // runs once the new tiles are in the DOM (mount, or the patch after a reload)
+        useEffect(
+            () => {
+                this._observe();
+                return () => this._observer?.disconnect();
+            },
+            () => [this.state.photos]
+        );
+    }
+
+    async _load(props) {
+        const key = `${props.record.resId}:${photoIds(props.record)}`;
+        if (!props.record.resId || key === this._key) {
+            return;
+        }
+        this._key = key;
+        // ETag-revalidated by the browser: unchanged galleries come back as 304
+        const resp = await fetch(`/crm_office_ui/lead/${props.record.resId}/photos`, {
+            credentials: "same-origin",
+        });
+        this.state.photos = resp.ok ? await resp.json() : [];
+    }
+
+    thumbUrl(photo, size) {
+        return `/web/image/ir.attachment/${photo.id}/datas/${size}x${size}?unique=${photo.checksum}`;
+    }
+
+    fullUrl(photo) {
+        return `/web/image/ir.attachment/${photo.id}/datas?unique=${photo.checksum}`;
+    }
+
+    _observe() {
+        const grid = this.gridRef.el;
+        if (!grid) {
+            return;
+        }
+        const show = (img) => {
+            img.src = img.dataset.src;
+            img.srcset = img.dataset.srcset;
+            delete img.dataset.src;
+        };
+        const pending = grid.querySelectorAll("img[data-src]");
+        if (!window.IntersectionObserver) {
+            pending.forEach(show);
+            return;
+        }
+        this._observer ||= new IntersectionObserver(
+            (entries, obs) => {
+                for (const e of entries) {
+                    if (e.isIntersecting) {
+                        show(e.target);
+                        obs.unobserve(e.target);
+                    }
+                }
+            },
+            { rootMargin: "200px" }
+        );
+        pending.forEach((img) => this._observer.observe(img));
+    }
+
+    open(photo) {
+        this.state.viewer = this.fullUrl(photo);
+    }
+
+    close() {
+        this.state.viewer = null;
+    }
+}
+
+registry.category("view_widgets").add("crm_photo_gallery", { component: CrmPhotoGallery });
@@ -0,0 +1,4 @@
+# -*- coding: utf-8 -*-
+from . import test_service_number
+from . import test_usta_geo_index
+from . import test_region_names
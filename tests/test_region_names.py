@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+from odoo.tests.common import BaseCase, tagged
+
+from odoo.addons.crm_office_ui.models.cc_region_index import CcRegion, _skeleton, normalize_region_name
+
+
+@tagged("post_install", "-at_install")
+class TestRegionNames(BaseCase):
+
+    def test_normalize_same_spelling(self):
+        for cyrillic, latin in [
+            ("Мирзо Улуғбек тумани", "Mirzo Ulug'bek t."),
+            ("Ғиждувон", "G'ijduvon"),
+            ("Ғиждувон тумани", "G‘ijduvon tumani"),
+            ("Юнусобод тумани", "Yunusobod"),
+            ("Тошкент шаҳри", "Toshkent sh."),
+            ("Яккасарой", "YAKKASAROY"),
+        ]:
+            self.assertEqual(normalize_region_name(cyrillic), normalize_region_name(latin), cyrillic)
+        self.assertEqual(normalize_region_name("Mirzo Ulug`bek tumani"), "mirzoulugbek")
+        self.assertEqual(normalize_region_name(None), "")
+        self.assertEqual(normalize_region_name("  tumani "), "")
+
+    def test_skeleton_russian_vs_uzbek(self):
+        # Russian and Uzbek spellings differ in vowels only: same skeleton, different names
+        for russian, uzbek in [("Чиланзар", "Chilonzor"), ("Алмазар", "Olmazor")]:
+            a, b = normalize_region_name(russian), normalize_region_name(uzbek)
+            self.assertNotEqual(a, b)
+            self.assertEqual(_skeleton(a), _skeleton(b))
+        self.assertNotEqual(_skeleton(normalize_region_name("Chilonzor")), _skeleton(normalize_region_name("Bektemir")))
+
+    def test_match_one(self):
+        rows = [
+            (normalize_region_name(name), _skeleton(normalize_region_name(name)), rid)
+            for rid, name in [(1, "Chilonzor"), (2, "Yunusobod"), (3, "Yangiyo'l"), (4, "Yangiyo'l shahri"), (5, "Bektemir")]
+        ]
+        self.assertEqual(CcRegion._match_one(normalize_region_name("Чиланзар тумани"), rows), 1)
+        self.assertEqual(CcRegion._match_one(normalize_region_name("Юнусобод"), rows), 2)
+        # both names normalize to 'yangiyol': the lowest id wins
+        self.assertEqual(CcRegion._match_one("yangiyol", rows), 3)
+        # substring (the old ilike behaviour)
+        self.assertEqual(CcRegion._match_one("bektemirtumanmarkazi", rows), 5)
+        self.assertFalse(CcRegion._match_one("", rows))
+        self.assertFalse(CcRegion._match_one("samarqand", rows))
+
+    def test_match_one_unique(self):
+        rows = [("olmazor", _skeleton("olmazor"), 7), ("olmazor", _skeleton("olmazor"), 8)]
+        # without a state the same name in two states is ambiguous
+        self.assertFalse(CcRegion._match_one("olmazor", rows, unique=True))
+        self.assertEqual(CcRegion._match_one("olmazor", rows), 7)
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+from odoo.tests.common import TransactionCase, tagged
+
+from odoo.addons.crm_office_ui.models.crm_lead import SERVICE_SEQ_CODE
+
+
+@tagged("post_install", "-at_install")
+class TestServiceNumber(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.Lead = cls.env["crm.lead"]
+
+    def _company_with_sequence(self, implementation, prefix="T/"):
+        company = self.env["res.company"].create({"name": f"SRV test ({implementation})"})
+        # a company sequence wins over the global one from data/sequence.xml
+        self.env["ir.sequence"].create({
+            "name": "SRV test",
+            "code": SERVICE_SEQ_CODE,
+            "company_id": company.id,
+            "prefix": prefix,
+            "padding": 4,
+            "number_next": 1,
+            "implementation": implementation,
+        })
+        return company
+
+    def test_reserve_standard(self):
+        company = self._company_with_sequence("standard")
+        self.assertEqual(self.Lead._reserve_service_numbers(company, 3), ["T/0001", "T/0002", "T/0003"])
+        self.assertEqual(self.Lead._reserve_service_numbers(company, 2), ["T/0004", "T/0005"])
+        self.assertEqual(self.Lead._next_service_number_for_company(company), "T/0006")
+
+    def test_reserve_no_gap(self):
+        company = self._company_with_sequence("no_gap")
+        self.assertEqual(self.Lead._reserve_service_numbers(company, 3), ["T/0001", "T/0002", "T/0003"])
+        self.assertEqual(self.Lead._reserve_service_numbers(company, 1), ["T/0004"])
+
+    def test_reserve_nothing(self):
+        company = self._company_with_sequence("standard")
+        self.assertEqual(self.Lead._reserve_service_numbers(company, 0), [])
+        self.assertEqual(self.Lead._reserve_service_numbers(company, 1), ["T/0001"])
+
+    def test_create_numbers_per_company(self):
+        company_a = self._company_with_sequence("standard")
+        company_b = self._company_with_sequence("no_gap", prefix="B/")
+        leads = self.Lead.create([
+            {"name": "a1", "company_id": company_a.id},
+            {"name": "b1", "company_id": company_b.id},
+            {"name": "a2", "company_id": company_a.id},
+            {"name": "kept", "company_id": company_a.id, "service_number": "MANUAL/1"},
+        ])
+        self.assertEqual(leads.mapped("service_number"), ["T/0001", "B/0001", "T/0002", "MANUAL/1"])
+
+    def test_create_number_from_team_company(self):
+        company = self._company_with_sequence("standard")
+        team = self.env["crm.team"].create({"name": "SRV team", "company_id": company.id})
+        lead = self.Lead.create({"name": "via team", "team_id": team.id})
+        self.assertEqual(lead.company_id, company)
+        self.assertEqual(lead.service_number, "T/0001")
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+import random
+
+from odoo.tests.common import BaseCase, tagged
+
+from odoo.addons.crm_office_ui.models.crm_lead import _haversine_km_many
+from odoo.addons.crm_office_ui.models.usta_geo_index import _UstaGrid
+
+
+@tagged("post_install", "-at_install")
+class TestUstaGrid(BaseCase):
+
+    def _random_grid(self, rnd, n=400):
+        grid = _UstaGrid()
+        for usta_id in range(1, n + 1):
+            # Uzbekistan, with a dense Tashkent cluster and a few far-away ustalar
+            if usta_id % 3:
+                lat, lng = rnd.uniform(41.2, 41.4), rnd.uniform(69.1, 69.4)
+            else:
+                lat, lng = rnd.uniform(37.5, 45.5), rnd.uniform(56.0, 73.0)
+            grid.put(usta_id, lat, lng, {rnd.randint(1, 5)}, {rnd.randint(1, 3)})
+        return grid
+
+    def _brute_force(self, grid, lat, lng, k, region_id=None, state_id=None):
+        ids = [u for u in grid.points if grid.eligible(u, region_id, state_id)]
+        pts = [grid.points[u] for u in ids]
+        kms = _haversine_km_many([lat] * len(ids), [lng] * len(ids), [p[0] for p in pts], [p[1] for p in pts])
+        return sorted(zip(ids, kms), key=lambda r: r[1])[:k]
+
+    def assertSameHits(self, got, expected):
+        self.assertEqual([u for u, _km in got], [u for u, _km in expected])
+        for (_u, a), (_v, b) in zip(got, expected):
+            self.assertAlmostEqual(a, b, places=6)
+
+    def test_nearest_matches_brute_force(self):
+        rnd = random.Random(17)
+        grid = self._random_grid(rnd)
+        for _i in range(60):
+            lat, lng = rnd.uniform(37.0, 46.0), rnd.uniform(55.0, 74.0)
+            k = rnd.choice((1, 5, 10, 50))
+            area = rnd.choice(((None, None), (rnd.randint(1, 5), None), (None, rnd.randint(1, 3))))
+            self.assertSameHits(grid.nearest(lat, lng, k, *area), self._brute_force(grid, lat, lng, k, *area))
+
+    def test_nearest_far_query_and_large_k(self):
+        grid = self._random_grid(random.Random(3), n=50)
+        # far outside the grid: every ring is empty up to MAX_RINGS, the rest is scanned
+        self.assertSameHits(grid.nearest(0.0, 0.0, 5), self._brute_force(grid, 0.0, 0.0, 5))
+        # more than there are ustalar: all of them, nearest first
+        self.assertSameHits(grid.nearest(41.3, 69.2, 500), self._brute_force(grid, 41.3, 69.2, 500))
+        self.assertEqual(grid.nearest(41.3, 69.2, 5, region_id=99), [])
+
+    def test_put_drop(self):
+        grid = _UstaGrid()
+        grid.put(1, 41.30, 69.25, [10], [1])
+        grid.put(2, 41.31, 69.26, [11], [1])
+        grid.put(1, 40.10, 67.80, [12], [2])  # moved to another region
+        self.assertEqual([u for u, _km in grid.nearest(41.30, 69.25, 2)], [2, 1])
+        self.assertTrue(grid.eligible(1, region_id=12))
+        self.assertFalse(grid.eligible(1, region_id=10))
+        grid.drop(2)
+        grid.drop(3)  # unknown: no-op
+        self.assertEqual([u for u, _km in grid.nearest(41.30, 69.25, 2)], [1])
+        self.assertFalse(grid.eligible(2, state_id=1))
+        self.assertEqual(sum(len(ids) for ids in grid.cells.values()), 1)